@@ -1,7 +1,9 @@
-from move_bot.components.update_service import update_service
-
-from sleekxmpp.plugins.base import register_plugin
-
-
 def load_components():
+    """
+    Register the component plugins.  The update service and sleekxmpp are imported here so that they are only loaded
+    when the bot is being set up.
+    """
+    from sleekxmpp.plugins.base import register_plugin
+    from move_bot.components.update_service.service import update_service
+
     register_plugin(update_service)
@@ -1,11 +1,25 @@
-from move_bot.components.commands.configure_client_details import configure_client_details
-from move_bot.components.commands.configure_access_token import configure_access_token
-from move_bot.components.commands.fetch_from_month import fetch_from_month
-
 from sleekxmpp.plugins.base import register_plugin
 
 
 def load_commands():
+    """
+    Register the command plugins.  The command modules are imported here rather than at package import time so that
+    importing the package does not pull in the command dependencies before the bot is being set up.
+    """
+    from move_bot.components.commands.configure_client_details import configure_client_details
+    from move_bot.components.commands.configure_access_token import configure_access_token
+    from move_bot.components.commands.fetch_from_month import fetch_from_month
+    from move_bot.components.commands.export_range import export_range
+    from move_bot.components.commands.import_archive import import_archive
+    from move_bot.components.commands.profile_updates import profile_updates
+    from move_bot.components.commands.query_events import query_events
+    from move_bot.components.commands.ledger_coverage import ledger_coverage
+
     register_plugin(configure_client_details)
     register_plugin(configure_access_token)
     register_plugin(fetch_from_month)
+    register_plugin(export_range)
+    register_plugin(import_archive)
+    register_plugin(profile_updates)
+    register_plugin(query_events)
+    register_plugin(ledger_coverage)
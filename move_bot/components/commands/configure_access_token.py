@@ -1,8 +1,8 @@
 import logging
-import moves
 from rhobot.components.commands.base_command import BaseCommand
 from move_bot.components.configuration_enums import IDENTIFIER_KEY, CLIENT_SECRET_KEY, CLIENT_TOKEN_KEY
 from move_bot.components.events import OAUTH_DETAILS_UPDATED
+from move_bot.components.oauth_tokens import exchange_code
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +27,8 @@ class ConfigureAccessToken(BaseCommand):
         :param initial_session:
         :return:
         """
+        import moves
+
         form = self._forms.make_form()
 
         previous_identifier = self._configuration.get_value(IDENTIFIER_KEY, 'unset')
@@ -68,14 +70,14 @@ class ConfigureAccessToken(BaseCommand):
         logger.info('MC ClientId: %s' % mc.client_id)
         logger.info('MC Secret: %s' % mc.client_secret)
 
-        # Attempt to get the proper tokens and store them in the database.
+        # Attempt to get the proper tokens and store them in the database, including the refresh token so that the
+        # update service can renew the access token before it expires.
         parts = urlparse(token)
         code = parse_qs(parts.query)['code'][0]
-        mc.access_token = mc.get_oauth_token(code)
+        tokens = exchange_code(mc.client_id, mc.client_secret, code)
+        mc.access_token = tokens[CLIENT_TOKEN_KEY]
 
-        self._configuration.merge_configuration({CLIENT_TOKEN_KEY: mc.access_token})
-        # TODO: Submit merge request to get the refresh token as well
-        # self.xmpp['rho_bot_configuration'].merge_configuration({'refresh_token': mc.refresh_token})
+        self._configuration.merge_configuration(tokens)
 
         session['has_next'] = False
         session['payload'] = None
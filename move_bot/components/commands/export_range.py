@@ -0,0 +1,73 @@
+"""
+Command that will export the data from a range of dates to an N-Triples file for bulk loading.
+"""
+from rhobot.components.commands.base_command import BaseCommand
+from move_bot.components.commands.forms import add_range_fields
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExportRange(BaseCommand):
+
+    name = 'export_range'
+    description = 'Export Range'
+    dependencies = BaseCommand.default_dependencies.union({'update_service', 'rho_bot_scheduler'})
+
+    def post_init(self):
+        super(ExportRange, self).post_init()
+        self._update_service = self.xmpp['update_service']
+        self._scheduler = self.xmpp['rho_bot_scheduler']
+
+    def command_start(self, request, initial_session):
+        """
+        Send out a form that asks for the date range and the file to write to in the export directory.
+        :param request:
+        :param initial_session:
+        :return:
+        """
+        form = self._forms.make_form()
+
+        add_range_fields(form)
+
+        form.add_field(var='path', label='Output File (in the export directory)', type='text-single', required=True)
+
+        initial_session['payload'] = form
+        initial_session['next'] = self._parse_form
+        initial_session['has_next'] = False
+
+        return initial_session
+
+    def _parse_form(self, payload, session):
+        """
+        Parse the form and start the process of executing the export.
+        :param payload: payload from the command
+        :param session: session value to update.
+        :return: session to return to the requester
+        """
+        import isodate
+
+        values = payload.get_values()
+        logger.debug('Export values for: %s - %s' % (values['start'], values['end']))
+
+        try:
+            start_date = isodate.parse_date(values['start'])
+            end_date = isodate.parse_date(values['end'])
+
+            if end_date < start_date:
+                raise ValueError('End date is before start date')
+
+            promise = self._update_service.export_for_range(start_date, end_date, values['path'])
+            promise = promise.then(lambda s: session)
+        except ValueError:
+            promise = self._scheduler.promise()
+            promise.rejected(ValueError())
+
+        session['payload'] = None
+        session['next'] = None
+        session['has_next'] = False
+
+        return promise
+
+
+export_range = ExportRange
@@ -4,7 +4,6 @@ Command that will add the data from a specific month.
 from rhobot.components.commands.base_command import BaseCommand
 from sleekxmpp.plugins.xep_0122 import FormValidation
 import logging
-import isodate
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +48,8 @@ class FetchFromMonth(BaseCommand):
         :param session: session value to update.
         :return: session to return to the requester
         """
+        import isodate
+
         logger.debug('Retrieve values for: %s' % payload.get_values()['month'])
 
         try:
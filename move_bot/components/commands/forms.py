@@ -0,0 +1,36 @@
+"""
+Helpers for building the forms that are shared between the commands.
+"""
+from sleekxmpp.plugins.xep_0122 import FormValidation
+
+
+def add_validated_field(form, var, label, datatype):
+    """
+    Add a required text field to the form that is validated against the datatype.
+    :param form: form to add the field to.
+    :param var: name of the field.
+    :param label: label of the field.
+    :param datatype: xml schema datatype of the field, e.g. xs:date
+    :return: the field
+    """
+    field = form.add_field(var=var, label=label, type='text-single', required=True)
+
+    validation = FormValidation()
+    validation['datatype'] = datatype
+    validation.set_basic(True)
+
+    field.append(validation)
+
+    return field
+
+
+def add_range_fields(form, datatype='xs:date', labels=('Start Date', 'End Date')):
+    """
+    Add the start and end fields of a range to the form.
+    :param form: form to add the fields to.
+    :param datatype: xml schema datatype of the fields.
+    :param labels: labels of the start and end fields.
+    :return:
+    """
+    add_validated_field(form, 'start', labels[0], datatype)
+    add_validated_field(form, 'end', labels[1], datatype)
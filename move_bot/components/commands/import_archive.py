@@ -0,0 +1,63 @@
+"""
+Command that will import the data from a Moves data export archive.
+"""
+from rhobot.components.commands.base_command import BaseCommand
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ImportArchive(BaseCommand):
+
+    name = 'import_archive'
+    description = 'Import Export Archive'
+    dependencies = BaseCommand.default_dependencies.union({'update_service', 'rho_bot_scheduler'})
+
+    def post_init(self):
+        super(ImportArchive, self).post_init()
+        self._update_service = self.xmpp['update_service']
+        self._scheduler = self.xmpp['rho_bot_scheduler']
+
+    def command_start(self, request, initial_session):
+        """
+        Send out a form that asks for the location of the archive.
+        :param request:
+        :param initial_session:
+        :return:
+        """
+        form = self._forms.make_form()
+        form.add_field(var='path', label='Archive File', type='text-single', required=True)
+
+        initial_session['payload'] = form
+        initial_session['next'] = self._parse_form
+        initial_session['has_next'] = False
+
+        return initial_session
+
+    def _parse_form(self, payload, session):
+        """
+        Parse the form and start the process of executing the import.
+        :param payload: payload from the command
+        :param session: session value to update.
+        :return: session to return to the requester
+        """
+        import os
+
+        path = payload.get_values()['path']
+        logger.debug('Import archive: %s' % path)
+
+        if os.path.isfile(path):
+            promise = self._update_service.import_archive(path)
+            promise = promise.then(lambda s: session)
+        else:
+            promise = self._scheduler.promise()
+            promise.rejected(ValueError())
+
+        session['payload'] = None
+        session['next'] = None
+        session['has_next'] = False
+
+        return promise
+
+
+import_archive = ImportArchive
@@ -0,0 +1,79 @@
+"""
+Command that will show the gaps in the ingestion ledger between two dates.
+"""
+from rhobot.components.commands.base_command import BaseCommand
+from move_bot.components.commands.forms import add_range_fields
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerCoverage(BaseCommand):
+
+    name = 'ledger_coverage'
+    description = 'Ledger Coverage'
+    dependencies = BaseCommand.default_dependencies.union({'update_service', 'rho_bot_scheduler'})
+
+    def post_init(self):
+        super(LedgerCoverage, self).post_init()
+        self._update_service = self.xmpp['update_service']
+        self._scheduler = self.xmpp['rho_bot_scheduler']
+
+    def command_start(self, request, initial_session):
+        """
+        Send out a form that asks for the date range.
+        :param request:
+        :param initial_session:
+        :return:
+        """
+        form = self._forms.make_form()
+
+        add_range_fields(form)
+
+        initial_session['payload'] = form
+        initial_session['next'] = self._parse_form
+        initial_session['has_next'] = False
+
+        return initial_session
+
+    def _parse_form(self, payload, session):
+        """
+        Parse the form and respond with the ranges of days that have not been completely ingested.
+        :param payload: payload from the command
+        :param session: session value to update.
+        :return: promise that provides the session to return to the requester
+        """
+        import isodate
+
+        values = payload.get_values()
+        logger.debug('Ledger coverage for: %s - %s' % (values['start'], values['end']))
+
+        promise = self._scheduler.promise()
+
+        try:
+            start_date = isodate.parse_date(values['start'])
+            end_date = isodate.parse_date(values['end'])
+        except ValueError:
+            promise.rejected(ValueError())
+            return promise
+
+        gaps = self._update_service.ledger.gaps(start_date, end_date)
+
+        form = self._forms.make_form(ftype='result', title='Coverage Gaps')
+        form.add_reported('start', label='Start')
+        form.add_reported('end', label='End')
+        form.add_reported('status', label='Status')
+
+        for start_day, end_day, status in gaps:
+            form.add_item({'start': start_day, 'end': end_day, 'status': status or 'missing'})
+
+        session['payload'] = form
+        session['next'] = None
+        session['has_next'] = False
+
+        promise.resolved(session)
+
+        return promise
+
+
+ledger_coverage = LedgerCoverage
@@ -0,0 +1,91 @@
+"""
+Command that will arm the profiler of the update service for the next update cycles or segments.
+"""
+from rhobot.components.commands.base_command import BaseCommand
+from sleekxmpp.plugins.xep_0122 import FormValidation
+from move_bot.components.update_service.profiler import CYCLES, SEGMENTS
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileUpdates(BaseCommand):
+
+    name = 'profile_updates'
+    description = 'Profile Updates'
+    dependencies = BaseCommand.default_dependencies.union({'update_service', 'rho_bot_scheduler'})
+
+    def post_init(self):
+        super(ProfileUpdates, self).post_init()
+        self._update_service = self.xmpp['update_service']
+        self._scheduler = self.xmpp['rho_bot_scheduler']
+
+    def command_start(self, request, initial_session):
+        """
+        Send out a form that shows the last captured profile and the work queue metrics, and asks for the number of
+        cycles or segments to profile next.
+        :param request:
+        :param initial_session:
+        :return:
+        """
+        profiler = self._update_service.profiler
+
+        form = self._forms.make_form()
+
+        form.add_field(var='summary', ftype='text-multi', label='Last Profile',
+                       value=profiler.last_summary or 'No profile captured')
+
+        metrics = self._update_service.work_queue.metrics()
+        form.add_field(var='queue', ftype='text-multi', label='Work Queue',
+                       value='\n'.join('%s: %s' % (key, metrics[key]) for key in sorted(metrics)))
+
+        count_field = form.add_field(var='count', ftype='text-single', label='Count',
+                                     desc='Number of cycles or segments to profile, 0 to leave disarmed',
+                                     required=True, value='0' if profiler.armed else '1')
+
+        validation = FormValidation()
+        validation['datatype'] = 'xs:integer'
+        validation.set_basic(True)
+
+        count_field.append(validation)
+
+        form.add_field(var='unit', ftype='list-single', label='Unit', required=True, value=CYCLES,
+                       options=[{'label': 'Update Cycles', 'value': CYCLES},
+                                {'label': 'Segments', 'value': SEGMENTS}])
+
+        initial_session['payload'] = form
+        initial_session['next'] = self._parse_form
+        initial_session['has_next'] = False
+
+        return initial_session
+
+    def _parse_form(self, payload, session):
+        """
+        Parse the form and arm the profiler.
+        :param payload: payload from the command
+        :param session: session value to update.
+        :return: promise that provides the session to return to the requester
+        """
+        values = payload.get_values()
+
+        promise = self._scheduler.promise()
+
+        try:
+            count = int(values['count'])
+            if count > 0:
+                self._update_service.profiler.arm(count, values['unit'])
+        except (ValueError, RuntimeError) as error:
+            logger.warning('Could not arm profiler: %s' % error)
+            promise.rejected(ValueError())
+            return promise
+
+        session['payload'] = None
+        session['next'] = None
+        session['has_next'] = False
+
+        promise.resolved(session)
+
+        return promise
+
+
+profile_updates = ProfileUpdates
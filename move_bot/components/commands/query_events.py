@@ -0,0 +1,90 @@
+"""
+Command that will list the events that this bot has ingested within a time range.
+"""
+from rhobot.components.commands.base_command import BaseCommand
+from move_bot.components.commands.forms import add_range_fields
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEvents(BaseCommand):
+
+    name = 'query_events'
+    description = 'Query Events'
+    dependencies = BaseCommand.default_dependencies.union({'update_service', 'rho_bot_scheduler'})
+
+    def post_init(self):
+        super(QueryEvents, self).post_init()
+        self._update_service = self.xmpp['update_service']
+        self._scheduler = self.xmpp['rho_bot_scheduler']
+
+    def command_start(self, request, initial_session):
+        """
+        Send out a form that asks for the time range.
+        :param request:
+        :param initial_session:
+        :return:
+        """
+        form = self._forms.make_form()
+
+        add_range_fields(form, datatype='xs:dateTime', labels=('Start Time', 'End Time'))
+
+        initial_session['payload'] = form
+        initial_session['next'] = self._parse_form
+        initial_session['has_next'] = False
+
+        return initial_session
+
+    def _parse_form(self, payload, session):
+        """
+        Parse the form and respond with the events that overlap the time range.  The events come from the index of
+        the update service, so the result states which events the index covers.
+        :param payload: payload from the command
+        :param session: session value to update.
+        :return: promise that provides the session to return to the requester
+        """
+        values = payload.get_values()
+        logger.debug('Query events: %s - %s' % (values['start'], values['end']))
+
+        event_index = self._update_service.event_index
+
+        promise = self._scheduler.promise()
+
+        try:
+            events = event_index.query(values['start'], values['end'])
+        except ValueError:
+            promise.rejected(ValueError())
+            return promise
+
+        started = event_index.started.replace(microsecond=0).isoformat()
+        if event_index.seeded:
+            instructions = 'Events stored when this instance started at %sZ, and the events it ingested since' % started
+        else:
+            instructions = 'Events ingested by this instance since %sZ, the stored events are still loading' % started
+
+        if self._update_service.shard_coordinator:
+            instructions += ', events ingested since start only include the days of its shard'
+
+        form = self._forms.make_form(ftype='result', title='Events', instructions=instructions)
+        form.add_reported('event', label='Event')
+        form.add_reported('start', label='Start')
+        form.add_reported('end', label='End')
+        form.add_reported('place', label='Place')
+
+        for event in events:
+            form.add_item({'event': str(event.event),
+                           'start': event.start.isoformat(),
+                           'end': event.end.isoformat(),
+                           'place': str(event.place) if event.place else ''})
+
+        session['payload'] = form
+        session['next'] = None
+        session['has_next'] = False
+
+        promise.resolved(session)
+
+        return promise
+
+
+query_events = QueryEvents
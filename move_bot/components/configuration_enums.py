@@ -5,3 +5,16 @@ List of magic strings used in this application.
 IDENTIFIER_KEY = 'identifier'
 CLIENT_SECRET_KEY = 'secret'
 CLIENT_TOKEN_KEY = 'access_token'
+
+# Comma separated list of the jids of the other move_bot instances that share the processing of the update cycles.
+SHARD_PEERS_KEY = 'shard_peers'
+
+# Ledger of the days that have been ingested, stored as json.
+LEDGER_KEY = 'ingestion_ledger'
+
+# Directory that the export_range command writes its files into.
+EXPORT_DIRECTORY_KEY = 'export_directory'
+
+# Refresh token, and the time (seconds since the epoch) that the access token expires at.
+REFRESH_TOKEN_KEY = 'refresh_token'
+TOKEN_EXPIRES_KEY = 'token_expires'
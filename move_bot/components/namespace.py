@@ -16,3 +16,11 @@ WGS_84 = Namespace('http://www.w3.org/2003/01/geo/wgs84_pos#')
 LOCATION = Namespace('http://www.w3.org/ns/locn#')
 
 TIMELINE = Namespace('http://purl.org/NET/c4dm/timeline.owl#')
+
+# Namespaces used to mint identifiers for nodes that are exported in bulk, rather than created by the storage bot.
+# Each of the nodes is identified by the startTime of the segment (or the place id) appended to the namespace.
+MOVES_EVENT = Namespace('urn:moves-app.com:event:')
+
+MOVES_INTERVAL = Namespace('urn:moves-app.com:interval:')
+
+MOVES_PLACE = Namespace('urn:moves-app.com:place:')
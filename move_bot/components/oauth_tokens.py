@@ -0,0 +1,76 @@
+"""
+Requests to the moves-app.com oauth token endpoint.
+
+The moves client only returns the access token when exchanging an authorization code, so the token endpoint is called
+directly in order to also get the refresh token and the expiry of the access token.
+"""
+import logging
+import time
+
+from move_bot.components.configuration_enums import CLIENT_TOKEN_KEY, REFRESH_TOKEN_KEY, TOKEN_EXPIRES_KEY
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = 'https://api.moves-app.com/oauth/v1/access_token'
+
+# Seconds to wait for the token endpoint before giving up on the request.
+TOKEN_TIMEOUT = 30.0
+
+
+def _request_token(params):
+    """
+    Post the parameters to the token endpoint.
+    :param params: request parameters.
+    :return: configuration dictionary containing the tokens and expiry.
+    """
+    import requests
+
+    try:
+        response = requests.post(TOKEN_URL, params=params, timeout=TOKEN_TIMEOUT)
+    except requests.RequestException as error:
+        logger.error('Token request failed: %s' % error)
+        raise RuntimeError('Token request failed: %s' % error)
+
+    try:
+        response = response.json()
+    except ValueError:
+        logger.error('Token request returned %s: %s' % (response.status_code, response.text))
+        raise RuntimeError('Token request returned an invalid response: %s' % response.status_code)
+
+    if 'access_token' not in response:
+        logger.error('Token request failed: %s' % response)
+        raise RuntimeError('Token request failed: %s' % response.get('error', 'unknown'))
+
+    configuration = {CLIENT_TOKEN_KEY: response['access_token']}
+
+    if 'refresh_token' in response:
+        configuration[REFRESH_TOKEN_KEY] = response['refresh_token']
+
+    if 'expires_in' in response:
+        configuration[TOKEN_EXPIRES_KEY] = str(int(time.time() + float(response['expires_in'])))
+
+    return configuration
+
+
+def exchange_code(identifier, secret, code):
+    """
+    Exchange an authorization code for the tokens.
+    :param identifier: client identifier.
+    :param secret: client secret.
+    :param code: authorization code.
+    :return: configuration dictionary containing the tokens and expiry.
+    """
+    return _request_token(dict(grant_type='authorization_code', code=code, client_id=identifier,
+                               client_secret=secret))
+
+
+def refresh_access_token(identifier, secret, refresh_token):
+    """
+    Use the refresh token to get a new access token.
+    :param identifier: client identifier.
+    :param secret: client secret.
+    :param refresh_token: refresh token.
+    :return: configuration dictionary containing the tokens and expiry.
+    """
+    return _request_token(dict(grant_type='refresh_token', refresh_token=refresh_token, client_id=identifier,
+                               client_secret=secret))
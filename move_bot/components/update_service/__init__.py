@@ -1 +0,0 @@
-from move_bot.components.update_service.service import update_service
@@ -0,0 +1,68 @@
+"""
+Read the daily places results out of a Moves data export archive.
+
+The export contains the same daily places json that is returned by the API, split into a file per day, per month and
+per year.  The per day files are read one at a time out of the archive so that only a single day is ever held in
+memory.  If the archive does not contain per day files, the per month files are used instead.  Some exports keep the
+json files in a json.zip archive inside of the export, which is read when the export has no place files of its own.
+"""
+import io
+import json
+import logging
+import re
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+DAILY_PLACES_PATTERN = re.compile(r'(^|/)daily/places/places_\d{8}\.json$')
+MONTHLY_PLACES_PATTERN = re.compile(r'(^|/)monthly/places/places_\d{6}\.json$')
+NESTED_ARCHIVE_PATTERN = re.compile(r'(^|/)json\.zip$')
+
+
+def _place_entries(archive):
+    """
+    Find the place files in the archive.
+    :param archive: ZipFile
+    :return: sorted list of the names of the daily place files, or the monthly place files if there are no daily ones.
+    """
+    names = archive.namelist()
+
+    entries = sorted(name for name in names if DAILY_PLACES_PATTERN.search(name))
+    if not entries:
+        entries = sorted(name for name in names if MONTHLY_PLACES_PATTERN.search(name))
+
+    return entries
+
+
+def read_daily_places(path):
+    """
+    Generator that provides each of the daily places results in the archive in date order.
+    :param path: path to the zipped export archive.
+    :return: generator of daily results.
+    :raises ValueError: if the archive does not contain any place files.
+    """
+    with zipfile.ZipFile(path) as archive:
+        entries = _place_entries(archive)
+
+        if not entries:
+            nested = sorted(name for name in archive.namelist() if NESTED_ARCHIVE_PATTERN.search(name))
+            if nested:
+                # The nested archive has to be seekable, so it is read into memory rather than streamed.
+                logger.info('Reading nested archive %s from: %s' % (nested[0], path))
+                archive = zipfile.ZipFile(io.BytesIO(archive.read(nested[0])))
+                entries = _place_entries(archive)
+
+        if not entries:
+            raise ValueError('No place files found in archive: %s' % path)
+
+        logger.info('Reading %s place files from: %s' % (len(entries), path))
+
+        for entry in entries:
+            stream = archive.open(entry)
+            try:
+                results = json.load(stream)
+            finally:
+                stream.close()
+
+            for date_result in results:
+                yield date_result
@@ -0,0 +1,122 @@
+"""
+Convert segments from the moves-api into rdf triples that can be loaded into the data store in a single operation.
+
+This builds the same graph that ProcessSegment builds one node at a time, but mints the identifiers of the nodes
+locally so that no requests have to be made to the storage bot.
+"""
+import logging
+
+from rdflib import Literal, URIRef
+from rdflib.namespace import RDF, RDFS, DC, DCTERMS
+
+from move_bot.components.namespace import EVENT, TIMELINE, MOVES_SEGMENT, WGS_84, SCHEMA, MOVES_EVENT, \
+    MOVES_INTERVAL, MOVES_PLACE
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentTripleWriter:
+    """
+    Callable that will write the triples for a collection of segments to a stream in N-Triples format.
+    """
+
+    def __init__(self, owner, creator=None):
+        """
+        Construct the writer.
+        :param owner: owner of the installation
+        :param creator: uri of the bot that is creating the nodes.
+        """
+        self._owner = URIRef(owner)
+        self._creator = URIRef(creator) if creator else None
+
+    def __call__(self, segments, stream):
+        """
+        Write all of the triples for the segments to the stream.  Each triple is written as soon as it is generated so
+        that the whole graph is never held in memory.
+        :param segments: iterable of segments to convert.
+        :param stream: file like object to write the triples to.
+        :return: number of triples written.
+        """
+        count = 0
+        for segment in segments:
+            for triple in self.triples(segment):
+                stream.write(u'%s %s %s .\n' % tuple(term.n3() for term in triple))
+                count += 1
+
+        logger.info('Wrote %s triples' % count)
+
+        return count
+
+    def triples(self, segment):
+        """
+        Generate the triples that describe a segment.
+        :param segment: segment to convert.
+        :return: generator of (subject, predicate, object) tuples.
+        """
+        event = MOVES_EVENT[segment['startTime']]
+        interval = MOVES_INTERVAL[segment['startTime']]
+
+        yield event, RDF.type, EVENT.Event
+        yield event, EVENT.agent, self._owner
+        yield event, RDFS.seeAlso, Literal(MOVES_SEGMENT[segment['startTime']])
+        yield event, EVENT.time, interval
+
+        if self._creator:
+            yield event, DCTERMS.creator, self._creator
+
+        yield interval, RDF.type, TIMELINE.Interval
+        yield interval, TIMELINE.start, Literal(segment['startTime'])
+        yield interval, TIMELINE.end, Literal(segment['endTime'])
+
+        if self._creator:
+            yield interval, DCTERMS.creator, self._creator
+
+        place_definition = segment.get('place', None)
+        if place_definition:
+            yield event, DC.title, Literal(place_definition.get('name', 'Unknown'))
+
+            place = self._place_uri(place_definition)
+            if place:
+                yield event, EVENT.place, place
+
+                for triple in self._place_triples(place, place_definition):
+                    yield triple
+
+    @staticmethod
+    def _place_uri(place_definition):
+        """
+        Determine the identifier of the place that the segment took place at.
+        :param place_definition: place definition from the segment.
+        :return: uri of the place, or None if the place can not be identified.
+        """
+        if 'id' in place_definition:
+            return MOVES_PLACE[str(place_definition['id'])]
+
+        return None
+
+    def _place_triples(self, place, place_definition):
+        """
+        Generate the triples that describe the place.
+        :param place: uri of the place.
+        :param place_definition: place definition from the segment.
+        :return: generator of triples.
+        """
+        yield place, RDF.type, WGS_84.SpatialThing
+
+        # Places created by the update cycles are found by this reference, so it is written out here as well.
+        if 'id' in place_definition:
+            yield place, RDFS.seeAlso, Literal(MOVES_PLACE[str(place_definition['id'])])
+
+        if place_definition.get('name', None):
+            yield place, SCHEMA.name, Literal(place_definition['name'])
+
+        if place_definition['type'] == 'foursquare':
+            yield place, RDFS.seeAlso, Literal('foursquare://venues/%s' % place_definition['foursquareId'])
+
+        location = place_definition.get('location', None)
+        if location:
+            yield place, WGS_84.lat, Literal(location['lat'])
+            yield place, WGS_84.long, Literal(location['lon'])
+
+        if self._creator:
+            yield place, DCTERMS.creator, self._creator
@@ -0,0 +1,130 @@
+"""
+Time sorted index of the events that have been ingested by this bot, so that time range queries can be answered
+without asking the storage bot.  The index is held in memory, so it is loaded from the data store when the bot starts,
+and kept up to date with the events that the bot ingests after that.
+"""
+import bisect
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_time(value):
+    """
+    Convert a moves-api or xs:dateTime time string into a datetime in utc.  Times without a timezone are treated as
+    utc.
+    :param value: time string.
+    :return: datetime
+    """
+    import isodate
+
+    if isinstance(value, datetime.datetime):
+        result = value
+    else:
+        result = isodate.parse_datetime(value)
+
+    if result.tzinfo is not None:
+        result = result.astimezone(isodate.UTC).replace(tzinfo=None)
+
+    return result
+
+
+class IndexedEvent:
+    """
+    Details of an event stored in the index.
+    """
+
+    def __init__(self, event, start, end, place=None):
+        self.event = event
+        self.start = start
+        self.end = end
+        self.place = place
+
+    def __repr__(self):
+        return 'IndexedEvent(%s, %s, %s, %s)' % (self.event, self.start, self.end, self.place)
+
+
+class EventIndex:
+    """
+    Index of events sorted by their start time.  Since events can overlap the beginning of the query range, the
+    longest duration of the events is tracked so that only the events that start within that duration of the query
+    range have to be checked.
+    """
+
+    def __init__(self):
+        self.started = datetime.datetime.utcnow()
+        self.seeded = False
+        self._starts = []
+        self._events = []
+        self._by_uri = {}
+        self._max_duration = datetime.timedelta(0)
+
+    def __len__(self):
+        return len(self._events)
+
+    def __contains__(self, event):
+        return event in self._by_uri
+
+    def add(self, event, start_time, end_time, place=None):
+        """
+        Add an event to the index, replacing the previous details of the event if it has already been indexed.
+        :param event: uri of the event.
+        :param start_time: start time of the event.
+        :param end_time: end time of the event.
+        :param place: uri of the place of the event.
+        :return:
+        """
+        self.remove(event)
+
+        entry = IndexedEvent(event, parse_time(start_time), parse_time(end_time), place)
+
+        position = bisect.bisect_right(self._starts, entry.start)
+        self._starts.insert(position, entry.start)
+        self._events.insert(position, entry)
+        self._by_uri[event] = entry
+
+        self._max_duration = max(self._max_duration, entry.end - entry.start)
+
+    def set_place(self, event, place):
+        """
+        Set the place of an event that has already been indexed.
+        :param event: uri of the event.
+        :param place: uri of the place.
+        :return:
+        """
+        entry = self._by_uri.get(event, None)
+        if entry is not None:
+            entry.place = place
+
+    def remove(self, event):
+        """
+        Remove an event from the index.
+        :param event: uri of the event.
+        :return:
+        """
+        entry = self._by_uri.pop(event, None)
+        if entry is None:
+            return
+
+        position = bisect.bisect_left(self._starts, entry.start)
+        while self._events[position] is not entry:
+            position += 1
+
+        del self._starts[position]
+        del self._events[position]
+
+    def query(self, start_time, end_time):
+        """
+        Find all of the events that overlap the time range.
+        :param start_time: start of the range.
+        :param end_time: end of the range.
+        :return: list of IndexedEvent sorted by start time.
+        """
+        start = parse_time(start_time)
+        end = parse_time(end_time)
+
+        first = bisect.bisect_left(self._starts, start - self._max_duration)
+        last = bisect.bisect_right(self._starts, end)
+
+        return [entry for entry in self._events[first:last] if entry.end >= start]
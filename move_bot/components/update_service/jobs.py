@@ -0,0 +1,144 @@
+"""
+Tracking of the update jobs that are executing in the update service, so that they can be cancelled and so that the
+windows of days that they are processing do not overlap.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(RuntimeError):
+    """
+    Raised in the promise chain of a job when the job has been cancelled.
+    """
+    pass
+
+
+class Job:
+    """
+    Update job that processes the segments of a window of days.  Days are strings in the form YYYYMMDD, which is the
+    prefix of the startTime of every segment.
+    """
+
+    def __init__(self, name, start_day=None, end_day=None):
+        """
+        Construct the job.
+        :param name: name of the job, used for logging.
+        :param start_day: first day of the window, or None if the window is not bounded.
+        :param end_day: last day of the window, or None if the window is not bounded.
+        """
+        self.name = name
+        self.start_day = start_day
+        self.end_day = end_day
+        self.cancelled = False
+        self.promise = None
+        self.days = set()
+        self.pending_days = set()
+
+    def __repr__(self):
+        return 'Job(%s, %s, %s)' % (self.name, self.start_day, self.end_day)
+
+    def cancel(self):
+        """
+        Cancel the job, the job will stop before processing its next segment.
+        :return:
+        """
+        logger.info('Cancelling job: %s' % self)
+        self.cancelled = True
+
+    def check(self):
+        """
+        Raise if the job has been cancelled.
+        :return:
+        """
+        if self.cancelled:
+            raise JobCancelled('Job cancelled: %s' % self)
+
+    def contains_day(self, day):
+        """
+        Determine if the day is inside of the window of the job.
+        :param day: day string.
+        :return:
+        """
+        return (self.start_day is None or self.start_day <= day) and (self.end_day is None or day <= self.end_day)
+
+    def covers(self, other):
+        """
+        Determine if the window of this job contains the entire window of the other job.
+        :param other: job to compare to.
+        :return:
+        """
+        if other.start_day is None or other.end_day is None:
+            return self.start_day is None and self.end_day is None
+
+        return self.contains_day(other.start_day) and self.contains_day(other.end_day)
+
+
+class JobTracker:
+    """
+    Collection of the jobs that are currently active.
+    """
+
+    def __init__(self):
+        self._jobs = []
+
+    def __iter__(self):
+        return iter(list(self._jobs))
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def add(self, job):
+        self._jobs.append(job)
+
+    def remove(self, job):
+        if job in self._jobs:
+            self._jobs.remove(job)
+
+    def find(self, name):
+        """
+        Find the active job with the name.
+        :param name: name of the job.
+        :return: job or None
+        """
+        for job in self._jobs:
+            if job.name == name:
+                return job
+
+        return None
+
+    def covering(self, job):
+        """
+        Find an active job with a bounded window that contains the entire window of the job.
+        :param job: job to compare to.
+        :return: job or None
+        """
+        for active in self._jobs:
+            if active is not job and active.start_day is not None and active.covers(job):
+                return active
+
+        return None
+
+    def claim(self, job, day, take_over=False):
+        """
+        Claim the day for processing by the job.  The first active job to claim a day is responsible for processing
+        the segments of that day, unless a later job takes it over.
+        :param job: job that is asking.
+        :param day: day string.
+        :param take_over: if True the day is taken away from any other job that has claimed it, and the other job will
+                          skip the segments of the day that it has not processed yet.
+        :return: True if the job is responsible for the day.
+        """
+        for active in self._jobs:
+            if active is job or day not in active.days:
+                continue
+
+            if not take_over:
+                return False
+
+            logger.info('%s taking over %s from %s' % (job, day, active))
+            active.days.discard(day)
+            active.pending_days.discard(day)
+
+        job.days.add(day)
+        return True
@@ -0,0 +1,196 @@
+"""
+Persistent ledger of the days that have been ingested, stored in the configuration of the bot.
+"""
+import datetime
+import json
+import logging
+
+from move_bot.components.configuration_enums import LEDGER_KEY
+
+logger = logging.getLogger(__name__)
+
+COMPLETE = 'complete'
+FAILED = 'failed'
+ENRICHING = 'enriching'
+
+
+class LedgerEntry:
+    """
+    Ingestion details of a single day.
+    """
+
+    def __init__(self, day, last_update=None, segment_count=0, status=FAILED):
+        self.day = day
+        self.last_update = last_update
+        self.segment_count = segment_count
+        self.status = status
+
+    def __repr__(self):
+        return 'LedgerEntry(%s, %s, %s, %s)' % (self.day, self.last_update, self.segment_count, self.status)
+
+
+class IngestionLedger:
+    """
+    Keeps track of the lastUpdate, number of segments and status of every day that has been ingested.  The ledger is
+    split into a configuration value per month, so that saving a change only writes the months that were modified.
+    Months are read from the configuration on first use, and the changes made since the last save are kept separately
+    so that they can be written on top of the latest stored value of the month.
+    """
+
+    def __init__(self, configuration):
+        """
+        Construct the ledger.
+        :param configuration: rho_bot_configuration plugin.
+        """
+        self._configuration = configuration
+        self._months = {}
+        self._changes = {}
+
+    @staticmethod
+    def _key(month):
+        return '%s:%s' % (LEDGER_KEY, month)
+
+    def _read(self, month):
+        """
+        Read the entries of the month from the configuration.
+        :param month: month string in the form YYYYMM.
+        :return: dictionary of LedgerEntry by day.
+        """
+        entries = {}
+
+        stored = self._configuration.get_value(key=self._key(month), default=None, persist_if_missing=False)
+        if stored:
+            try:
+                for day, (last_update, segment_count, status) in json.loads(stored).items():
+                    entries[day] = LedgerEntry(day, last_update, segment_count, status)
+            except (ValueError, TypeError):
+                logger.exception('Could not read the ingestion ledger for: %s' % month)
+
+        return entries
+
+    def reset(self):
+        """
+        Forget the months that have been read, so that they are read from the configuration again.  Changes that have
+        not been saved yet are kept.
+        :return:
+        """
+        self._months = {}
+
+    def get(self, day):
+        """
+        Retrieve the entry of the day.
+        :param day: day string in the form YYYYMMDD.
+        :return: LedgerEntry or None
+        """
+        month = day[:6]
+
+        changes = self._changes.get(month, {})
+        if day in changes:
+            return changes[day]
+
+        if month not in self._months:
+            self._months[month] = self._read(month)
+
+        return self._months[month].get(day, None)
+
+    def _record(self, entry):
+        self._changes.setdefault(entry.day[:6], {})[entry.day] = entry
+
+    def is_complete(self, day, last_update=None):
+        """
+        Determine if the day has been completely ingested.
+        :param day: day string.
+        :param last_update: if provided, the day must have been ingested at or after this lastUpdate.
+        :return:
+        """
+        entry = self.get(day)
+        if entry is None or entry.status != COMPLETE:
+            return False
+
+        if last_update is not None and (entry.last_update is None or entry.last_update < last_update):
+            return False
+
+        return True
+
+    def complete(self, day, last_update, segment_count):
+        """
+        Record that the day has been completely ingested.
+        :param day: day string.
+        :param last_update: lastUpdate of the day that was ingested.
+        :param segment_count: number of segments in the day.
+        :return:
+        """
+        self._record(LedgerEntry(day, last_update, segment_count, COMPLETE))
+
+    def enriching(self, day, last_update, segment_count):
+        """
+        Record that all of the segments of the day have been processed, but that the places of its events are still
+        being resolved.  The day is not complete until the places have been resolved.
+        :param day: day string.
+        :param last_update: lastUpdate of the day that was ingested.
+        :param segment_count: number of segments in the day.
+        :return:
+        """
+        self._record(LedgerEntry(day, last_update, segment_count, ENRICHING))
+
+    def fail(self, day):
+        """
+        Record that the ingestion of the day did not complete.  The details of the previous ingestion are kept.
+        :param day: day string.
+        :return:
+        """
+        previous = self.get(day)
+        if previous is None:
+            self._record(LedgerEntry(day))
+        else:
+            self._record(LedgerEntry(day, previous.last_update, previous.segment_count, FAILED))
+
+    def save(self):
+        """
+        Store the months that have been modified since the last save.  Each month is read again before it is written,
+        so that entries stored by anything else since it was read are not overwritten.
+        :return:
+        """
+        if not self._changes:
+            return
+
+        values = {}
+        for month, changes in self._changes.items():
+            entries = self._read(month)
+            entries.update(changes)
+            self._months[month] = entries
+
+            stored = dict((day, [entry.last_update, entry.segment_count, entry.status])
+                          for day, entry in entries.items())
+            values[self._key(month)] = json.dumps(stored, sort_keys=True, separators=(',', ':'))
+
+        self._configuration.merge_configuration(values)
+        self._changes = {}
+
+    def gaps(self, start_date, end_date):
+        """
+        Find the ranges of days between the dates that have not been completely ingested.
+        :param start_date: datetime.date object
+        :param end_date: datetime.date object
+        :return: list of (start day, end day, status) tuples, status is the status shared by all of the days of the gap
+                 or None if they have never been ingested.
+        """
+        gaps = []
+        date = start_date
+        while date <= end_date:
+            day = date.strftime('%Y%m%d')
+
+            if not self.is_complete(day):
+                entry = self.get(day)
+                status = entry.status if entry else None
+
+                # Neighbouring days are only merged into the same gap if they have the same status.
+                if gaps and gaps[-1][1] == (date - datetime.timedelta(days=1)).strftime('%Y%m%d') and \
+                        gaps[-1][2] == status:
+                    gaps[-1] = (gaps[-1][0], day, status)
+                else:
+                    gaps.append((day, day, status))
+
+            date += datetime.timedelta(days=1)
+
+        return gaps
@@ -1,6 +1,30 @@
 from rhobot.components.storage import StoragePayload
 from rhobot.namespace import WGS_84, LOCATION, SCHEMA
-from rdflib.namespace import RDFS
+from rdflib.namespace import RDFS, DCTERMS
+from move_bot.components.namespace import MOVES_PLACE
+
+
+def index_place(storage_client, spatial_index, place):
+    """
+    Look up the coordinates of a stored place and add them to the spatial index.
+    :param storage_client: rho_bot_storage_client plugin.
+    :param spatial_index: index to add the place to.
+    :param place: uri of the place.
+    :return: promise that provides the place uri.
+    """
+    request = StoragePayload()
+    request.about = place
+
+    def handle_result(result):
+        latitude = result.properties.get(str(WGS_84.lat), None)
+        longitude = result.properties.get(str(WGS_84.long), None)
+
+        if latitude and longitude and spatial_index.nearest(float(latitude[0]), float(longitude[0])) != place:
+            spatial_index.insert(float(latitude[0]), float(longitude[0]), place)
+
+        return place
+
+    return storage_client.get_node(request).then(handle_result)
 
 
 class LocationHandler:
@@ -9,6 +33,8 @@ class LocationHandler:
         self._rdf_publisher = bot['rho_bot_rdf_publish']
         self._storage_client = bot['rho_bot_storage_client']
         self._scheduler = bot['rho_bot_scheduler']
+        self._representation_manager = bot['rho_bot_representation_manager']
+        self._spatial_index = bot['update_service'].spatial_index
         self._owner = owner
 
     def __call__(self, place_definition):
@@ -21,12 +47,26 @@ class LocationHandler:
             promise = self._process_foursquare(place_definition['foursquareId'])
         elif place_definition['type'] == 'home':
             promise = self._process_home_location()
+        elif place_definition.get('location', None):
+            promise = self._process_coordinates(place_definition)
         else:
             promise = self._scheduler.promise()
             promise.resolved([])
 
         return promise
 
+    def _index_result(self, result):
+        """
+        Add the first of the places found by another bot to the spatial index, so that segments that only provide
+        coordinates near it are matched to it.  The lookup of the coordinates is not waited on.
+        :param result: list of place uris.
+        :return: result
+        """
+        if result:
+            index_place(self._storage_client, self._spatial_index, result[0])
+
+        return result
+
     def _process_foursquare(self, foursquare_id):
         """
         Process the foursquare identifier and request that a different bot provide information about it.
@@ -39,7 +79,7 @@ class LocationHandler:
                                       'foursquare://venues/%s' % foursquare_id)
 
         promise = self._rdf_publisher.send_out_request(location_request)
-        promise = promise.then(self._handle_foursquare_result)
+        promise = promise.then(self._handle_foursquare_result).then(self._index_result)
 
         return promise
 
@@ -56,7 +96,7 @@ class LocationHandler:
         # Ask the owner if it has an address
         get_request = StoragePayload()
         get_request.about = self._owner
-        promise = self._storage_client.get_node(get_request).then(self._handle_home_result)
+        promise = self._storage_client.get_node(get_request).then(self._handle_home_result).then(self._index_result)
 
         return promise
 
@@ -73,3 +113,72 @@ class LocationHandler:
             return result.references[str(SCHEMA.homeLocation)]
 
         return []
+
+    def _process_coordinates(self, place_definition):
+        """
+        Match a place that only provides coordinates to a place that has already been stored.  If the place has a
+        moves identifier, the data store is checked for a place created from the same moves place first, so that
+        different moves places close to each other are kept apart.  Otherwise, or if that misses, the spatial index is
+        checked, and only if both miss is a new place created.
+        :param place_definition: place definition from the segment.
+        :return: promise that provides a list containing the uri of the place.
+        """
+        latitude = place_definition['location']['lat']
+        longitude = place_definition['location']['lon']
+
+        def index_result(result):
+            if self._spatial_index.nearest(latitude, longitude) != result[0]:
+                self._spatial_index.insert(latitude, longitude, result[0])
+            return result
+
+        def match_coordinates(*args):
+            identifier = self._spatial_index.nearest(latitude, longitude)
+            if identifier:
+                return [identifier]
+
+            return self._create_place(place_definition).then(index_result)
+
+        def handle_find_result(result):
+            if result.results:
+                return index_result([rdf.about for rdf in result.results])
+
+            return match_coordinates()
+
+        if 'id' in place_definition:
+            find_request = StoragePayload()
+            find_request.add_type(WGS_84.SpatialThing)
+            find_request.add_property(RDFS.seeAlso, MOVES_PLACE[str(place_definition['id'])])
+
+            return self._storage_client.find_nodes(find_request).then(handle_find_result)
+
+        promise = self._scheduler.promise()
+        promise.resolved(None)
+
+        return promise.then(match_coordinates)
+
+    def _create_place(self, place_definition):
+        """
+        Create a new place node for the place definition.
+        :param place_definition: place definition from the segment.
+        :return: promise that provides a list containing the uri of the place.
+        """
+        payload = StoragePayload()
+        payload.add_type(WGS_84.SpatialThing)
+        payload.add_property(WGS_84.lat, place_definition['location']['lat'])
+        payload.add_property(WGS_84.long, place_definition['location']['lon'])
+
+        if 'id' in place_definition:
+            payload.add_property(RDFS.seeAlso, MOVES_PLACE[str(place_definition['id'])])
+
+        if place_definition.get('name', None):
+            payload.add_property(SCHEMA.name, place_definition['name'])
+
+        creator = self._representation_manager.representation_uri
+        if creator:
+            payload.add_property(DCTERMS.creator, creator)
+
+        promise = self._storage_client.create_node(payload)
+
+        promise.then(self._scheduler.generate_promise_handler(self._rdf_publisher.publish_all_results, created=True))
+
+        return promise.then(lambda result: [rdf.about for rdf in result.results])
@@ -0,0 +1,289 @@
+"""
+Background stage that resolves the places of events after the events have been written, so that the processing of the
+segments does not have to wait for other bots to answer the place lookups.
+"""
+import logging
+
+from rhobot.components.storage import StoragePayload
+
+from move_bot.components.namespace import EVENT
+from move_bot.components.update_service.location_handler import LocationHandler
+
+logger = logging.getLogger(__name__)
+
+
+def place_key(place_definition, owner):
+    """
+    Key that identifies the place definition, so that each place is only looked up once per batch.
+    :param place_definition: place definition from the segment.
+    :param owner: owner of the installation.
+    :return: hashable key, or None if the place can not be resolved.
+    """
+    place_type = place_definition.get('type', None)
+
+    if place_type == 'foursquare':
+        return place_type, place_definition['foursquareId']
+    elif place_type == 'home':
+        return place_type, owner
+    elif 'id' in place_definition:
+        return 'place', place_definition['id']
+    elif place_definition.get('location', None):
+        return 'location', place_definition['location']['lat'], place_definition['location']['lon']
+
+    return None
+
+
+class PlaceEnricher:
+    """
+    Queue of events waiting for their place to be resolved.  The queue is flushed after a delay or once it reaches the
+    batch size, and each unique place in the batch is looked up once before the events referencing it are patched.
+
+    Places that fail to be looked up or patched are retried with an exponential backoff.  The number of events that
+    are waiting for each day is tracked, and on_day_finished is called with the day and whether all of its events were
+    enriched once none of them are waiting any more.
+    """
+
+    PENDING = 'pending'
+    FAILED = 'failed'
+
+    def __init__(self, xmpp, delay=5.0, batch_size=50, retry_delay=30.0, max_retry_delay=1800.0, max_attempts=8):
+        """
+        Construct the enricher.
+        :param xmpp: bot details.
+        :param delay: seconds to wait for more events before flushing the queue.
+        :param batch_size: number of events that will cause the queue to be flushed immediately.
+        :param retry_delay: seconds to wait before the first retry of a place that failed.
+        :param max_retry_delay: maximum number of seconds to wait between retries.
+        :param max_attempts: number of attempts made for a place before its events are given up on.
+        """
+        self.xmpp = xmpp
+        self.on_day_finished = None
+        self._delay = delay
+        self._batch_size = batch_size
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._max_attempts = max_attempts
+        self._queue = []
+        self._scheduled = False
+        self._running = False
+        self._resolved = {}
+        self._day_counts = {}
+        self._failed_days = set()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def resolved(self, place_definition, owner):
+        """
+        Uri of the place that the place definition was last resolved to.
+        :param place_definition: place definition from the segment.
+        :param owner: owner of the installation.
+        :return: uri or None if it has not been resolved.
+        """
+        return self._resolved.get(place_key(place_definition, owner), None)
+
+    def day_state(self, day):
+        """
+        Determine the state of the enrichment of the events of the day.
+        :param day: day string.
+        :return: PENDING if events of the day are waiting, FAILED if events of the day were given up on, otherwise None.
+        """
+        if self._day_counts.get(day, 0):
+            return self.PENDING
+        elif day in self._failed_days:
+            return self.FAILED
+
+        return None
+
+    def forget_day(self, day):
+        """
+        Forget that the events of the day were given up on, once the failure has been recorded.
+        :param day: day string.
+        :return:
+        """
+        self._failed_days.discard(day)
+
+    def enqueue(self, event, place_definition, owner, day=None):
+        """
+        Queue the event to have its place resolved.
+        :param event: uri of the event.
+        :param place_definition: place definition from the segment.
+        :param owner: owner of the installation.
+        :param day: day that the event was provided for.
+        :return:
+        """
+        key = place_key(place_definition, owner)
+        if key is None:
+            return
+
+        if day is not None:
+            self._day_counts[day] = self._day_counts.get(day, 0) + 1
+
+        self._queue.append((key, event, place_definition, owner, day, 0))
+
+        if len(self._queue) >= self._batch_size:
+            self.xmpp['rho_bot_scheduler'].defer(self.flush)
+        elif not self._scheduled:
+            self._scheduled = True
+            self.xmpp['rho_bot_scheduler'].schedule_task(self.flush, delay=self._delay, repeat=False)
+
+    def flush(self):
+        """
+        Resolve the places of all of the queued events.  Only one batch is processed at a time, events queued while a
+        batch is processing are picked up once it is done.
+        :return:
+        """
+        self._scheduled = False
+
+        if self._running or not self._queue:
+            return
+
+        batch, self._queue = self._queue, []
+        self._running = True
+
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[0], []).append(item)
+
+        logger.info('Resolving %s places for %s events' % (len(groups), len(batch)))
+
+        scheduler = self.xmpp['rho_bot_scheduler']
+
+        # The lookups are serialized so that places created from coordinates are in the spatial index before the next
+        # lookup is made.
+        promise = None
+        for key, items in groups.items():
+            lookup = scheduler.generate_promise_handler(self._resolve, key, items)
+            if promise is None:
+                promise = scheduler.defer(lambda lookup=lookup: lookup(None))
+            else:
+                promise = promise.then(lookup, lookup)
+
+        promise.then(self._finish_batch, self._finish_batch)
+
+    def _finish_batch(self, *args):
+        self._running = False
+
+        if self._queue:
+            self.flush()
+
+    def _resolve(self, previous, key, items):
+        """
+        Look up the place, unless it has already been resolved, and patch the events that reference it.
+        :param previous: result of the previous lookup in the batch.
+        :param key: place key of the items.
+        :param items: queued items of the events at the place.
+        :return: promise that is resolved once the items have been handled, whether or not they succeeded.
+        """
+        scheduler = self.xmpp['rho_bot_scheduler']
+        place_definition, owner = items[0][2], items[0][3]
+
+        if key in self._resolved:
+            promise = scheduler.promise()
+            promise.resolved([self._resolved[key]])
+        else:
+            try:
+                promise = LocationHandler(self.xmpp, owner)(place_definition)
+            except Exception as error:
+                # Failing before the lookup was sent is retried like any other failure, rather than losing the items.
+                promise = scheduler.promise()
+                promise.rejected(error)
+
+        def handle_locations(locations):
+            if not locations:
+                # Foursquare places are resolved by another bot, so no answer means that bot is slow or absent rather
+                # than that the place does not exist.  Other places, such as a home without an address, can really
+                # resolve to nothing.
+                if key[0] == 'foursquare':
+                    raise RuntimeError('No place found for: %s' % place_definition['foursquareId'])
+
+                return None
+
+            self._resolved[key] = locations[0]
+            return self._patch_events(locations[0], [item[1] for item in items])
+
+        def handle_success(result):
+            self._items_finished(items, True)
+
+        def handle_failure(error):
+            logger.warning('Could not resolve place %s: %s' % (place_definition, error))
+            self._retry(items)
+
+        return promise.then(handle_locations).then(handle_success, handle_failure)
+
+    def _retry(self, items):
+        """
+        Queue the items again after a delay that doubles with each attempt, or give up on them once they have run out
+        of attempts.
+        :param items: queued items that failed.
+        :return:
+        """
+        attempt = items[0][5] + 1
+
+        if attempt >= self._max_attempts:
+            logger.error('Giving up on place after %s attempts: %s' % (attempt, items[0][2]))
+            self._items_finished(items, False)
+            return
+
+        delay = min(self._retry_delay * 2 ** (attempt - 1), self._max_retry_delay)
+        retried = [item[:5] + (attempt,) for item in items]
+
+        def requeue():
+            self._queue.extend(retried)
+            self.flush()
+
+        self.xmpp['rho_bot_scheduler'].schedule_task(requeue, delay=delay, repeat=False)
+
+    def _items_finished(self, items, success):
+        """
+        Stop tracking the items, and notify when all of the events of a day have been handled.
+        :param items: queued items that have been handled.
+        :param success: True if the places of the events were stored.
+        :return:
+        """
+        for item in items:
+            day = item[4]
+            if day is None:
+                continue
+
+            if not success:
+                self._failed_days.add(day)
+
+            self._day_counts[day] -= 1
+            if self._day_counts[day] == 0:
+                del self._day_counts[day]
+
+                if self.on_day_finished:
+                    self.on_day_finished(day, day not in self._failed_days)
+
+    def _patch_events(self, location, events):
+        """
+        Add the place reference to each of the events.  The events are updated one after the other.
+        :param location: uri of the place.
+        :param events: uris of the events.
+        :return: promise that is resolved once all of the events have been updated.
+        """
+        storage_client = self.xmpp['rho_bot_storage_client']
+        publisher = self.xmpp['rho_bot_rdf_publish']
+        scheduler = self.xmpp['rho_bot_scheduler']
+        event_index = self.xmpp['update_service'].event_index
+
+        def patch(previous, event):
+            payload = StoragePayload()
+            payload.about = event
+            payload.add_type(EVENT.Event)
+            payload.add_reference(key=EVENT.place, value=location)
+
+            def patched(result):
+                publisher.publish_all_results(result, created=False)
+                event_index.set_place(event, location)
+
+            return storage_client.update_node(payload).then(patched)
+
+        promise = scheduler.promise()
+        promise.resolved(None)
+
+        for event in events:
+            promise = promise.then(scheduler.generate_promise_handler(patch, event))
+
+        return promise
@@ -9,7 +9,6 @@ import logging
 from rhobot.components.storage import StoragePayload
 
 from move_bot.components.update_service.interval_handler import IntervalHandler
-from move_bot.components.update_service.location_handler import LocationHandler
 from move_bot.components.namespace import EVENT, MOVES_SEGMENT
 from rdflib.namespace import RDFS, DC, DCTERMS
 
@@ -26,16 +25,21 @@ class ProcessSegment:
         Update the contents of that event.
     Else:
         Create the new event.
+
+    The place of the event is not resolved here, the event is queued for the place enrichment stage once it has been
+    written, unless the place stored for the event is the one that the segment's place was last resolved to.
     """
 
-    def __init__(self, segment, owner, xmpp):
+    def __init__(self, segment, owner, xmpp, day=None):
         """
         Construct the callable.
         :param segment: segment to process.
         :param owner: owner of the installation
         :param xmpp: bot details
+        :param day: day that the segment was provided for.
         """
         self._segment = segment
+        self._day = day
         self._scheduler = xmpp['rho_bot_scheduler']
         self._storage_client = xmpp['rho_bot_storage_client']
         self._promise = None
@@ -43,10 +47,12 @@ class ProcessSegment:
         self._representation_manager = xmpp['rho_bot_representation_manager']
         self._owner = owner
         self._node_id = None
+        self._location = None
+        self._event_index = xmpp['update_service'].event_index
+        self._place_enricher = xmpp['update_service'].place_enricher
         self.xmpp = xmpp
 
         self.interval_handler = IntervalHandler(xmpp)
-        self.location_handler = LocationHandler(xmpp, owner)
 
     def __call__(self, *args):
         """
@@ -71,39 +77,35 @@ class ProcessSegment:
     def _finish_process(self, session=None):
         """
         Common exit point for the promise chain.
-        :param session:
+        :param session: uri of the event that was created or updated.
         :return:
         """
+        if session:
+            self._event_index.add(session, self._segment['startTime'], self._segment['endTime'], self._location)
+
+            place_definition = self._segment.get('place', None)
+            if place_definition and (self._location is None or
+                                     self._location != self._place_enricher.resolved(place_definition, self._owner)):
+                self._place_enricher.enqueue(session, place_definition, self._owner, self._day)
+
         self._promise.resolved(session)
         return None
 
     def _handle_find_result(self, result):
         if result.results:
             self._node_id = result.results[0].about
-            update_promise = self._scheduler.defer(self.start_session).then(self._find_place)
+            update_promise = self._scheduler.defer(self.start_session)
             update_promise = update_promise.then(self._get_interval).then(self._update_node)
             update_promise.then(self._finish_process, lambda s: self._promise.rejected(s))
             return update_promise
         else:
-            create_promise = self._scheduler.defer(self.start_session).then(self._find_place)
+            create_promise = self._scheduler.defer(self.start_session)
             create_promise = create_promise.then(self._create_interval).then(self._create_node)
             create_promise.then(self._finish_process, lambda s: self._promise.rejected(s))
             return create_promise
 
     def start_session(self):
-        return dict()
-
-    def _find_place(self, session):
-        """
-        Find the place associated with the segment.
-        :param session:
-        :return:
-        """
-        logger.debug('Finding place: %s' % session)
-        location_promise = self.location_handler(self._segment['place']).then(
-            self._scheduler.generate_promise_handler(self._update_session, session, 'location'))
-
-        return location_promise
+        return dict(location=[])
 
     def _get_interval(self, session):
         """
@@ -119,6 +121,12 @@ class ProcessSegment:
             if interval_reference:
                 interval_reference = interval_reference[0]
 
+            # Keep the place that has already been resolved for the event, it is only enriched again if the place of
+            # the segment resolves to a different place.
+            place_reference = result.references.get(str(EVENT.place), None)
+            if place_reference:
+                self._location = place_reference[0]
+
             interval_promise = self.interval_handler(interval_reference,
                                                      self._segment['startTime'],
                                                      self._segment['endTime'])
@@ -202,7 +210,8 @@ class ProcessSegment:
         payload.add_property(RDFS.seeAlso, MOVES_SEGMENT[self._segment['startTime']])
 
         if session['location']:
-            payload.add_reference(key=EVENT.place, value=session['location'][0])
+            self._location = session['location'][0]
+            payload.add_reference(key=EVENT.place, value=self._location)
 
         if session['interval']:
             payload.add_reference(key=EVENT.time, value=session['interval'][0])
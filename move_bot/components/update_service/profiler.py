@@ -0,0 +1,144 @@
+"""
+Profiler that can be armed to capture the cpu and allocation profile of the next update cycles or segments.
+
+When the profiler is not armed the hooks only check a flag, so they can be left in place in production.
+"""
+import cProfile
+import logging
+import pstats
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+logger = logging.getLogger(__name__)
+
+CYCLES = 'cycles'
+SEGMENTS = 'segments'
+
+
+class UpdateProfiler:
+    """
+    Captures a cProfile (and tracemalloc when available) profile of the next count cycles or segments.
+    """
+
+    def __init__(self, limit=20):
+        """
+        Construct the profiler.
+        :param limit: number of functions and allocation sites to include in the summary.
+        """
+        self._limit = limit
+        self._unit = None
+        self._remaining = 0
+        self._profile = None
+        self._job = None
+        self.last_summary = None
+
+    @property
+    def armed(self):
+        return self._unit is not None
+
+    def arm(self, count, unit=CYCLES):
+        """
+        Arm the profiler to capture the next count cycles or segments.
+        :param count: number of cycles or segments to capture.
+        :param unit: CYCLES or SEGMENTS
+        :return:
+        """
+        if unit not in (CYCLES, SEGMENTS):
+            raise ValueError('Unknown unit: %s' % unit)
+
+        if self.armed:
+            raise RuntimeError('Profiler is already armed')
+
+        logger.info('Arming profiler for %s %s' % (count, unit))
+        self._unit = unit
+        self._remaining = count
+
+    def cycle_started(self):
+        """
+        Hook called when an update cycle starts.
+        :return:
+        """
+        if self._unit == CYCLES and self._profile is None:
+            self._begin()
+
+    def segment_started(self, job=None):
+        """
+        Hook called when a segment starts being processed, which is also when the previous segment has finished.
+        :param job: job that the segment is being processed for.
+        :return:
+        """
+        if self._unit != SEGMENTS:
+            return
+
+        if self._profile is None:
+            self._job = job
+            self._begin()
+            return
+
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self._end()
+
+    def job_finished(self, job=None, cycle=False):
+        """
+        Hook called when a job has finished processing all of its segments.  A segment capture is only ended early
+        when the job that its first segment belonged to finishes.
+        :param job: job that finished.
+        :param cycle: True if the job was an update cycle.
+        :return:
+        """
+        if self._profile is None:
+            return
+
+        if self._unit == CYCLES:
+            if not cycle:
+                return
+
+            self._remaining -= 1
+            if self._remaining > 0:
+                return
+        elif job is not self._job:
+            return
+
+        self._end()
+
+    def _begin(self):
+        if tracemalloc is not None:
+            tracemalloc.start()
+
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def _end(self):
+        self._profile.disable()
+
+        output = StringIO()
+        stats = pstats.Stats(self._profile, stream=output)
+        stats.sort_stats('cumulative').print_stats(r'move_bot|rhobot', self._limit)
+
+        if tracemalloc is not None:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+            snapshot = snapshot.filter_traces((tracemalloc.Filter(True, '*move_bot*'),
+                                               tracemalloc.Filter(True, '*rhobot*')))
+
+            output.write('Top allocation sites:\n')
+            for statistic in snapshot.statistics('lineno')[:self._limit]:
+                output.write('%s\n' % statistic)
+
+        self.last_summary = output.getvalue()
+        logger.info('Profile captured:\n%s' % self.last_summary)
+
+        self._profile = None
+        self._job = None
+        self._unit = None
+        self._remaining = 0
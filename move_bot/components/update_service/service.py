@@ -1,14 +1,30 @@
 """
 Component of the move bot that will load up the data from the update service.
 """
-import moves
-from rdflib.namespace import Namespace, FOAF
+import calendar
+import datetime
+import functools
+import io
+import os
+import time
+from rdflib.namespace import Namespace, FOAF, RDFS
 from rhobot.namespace import RHO
 from rhobot.components.storage import StoragePayload
 from sleekxmpp.plugins.base import base_plugin
 from rhobot.components.configuration import BotConfiguration
-from move_bot.components.configuration_enums import CLIENT_SECRET_KEY, IDENTIFIER_KEY, CLIENT_TOKEN_KEY
-from move_bot.components.update_service.process_segment import ProcessSegment
+from move_bot.components.configuration_enums import CLIENT_SECRET_KEY, IDENTIFIER_KEY, CLIENT_TOKEN_KEY, \
+    SHARD_PEERS_KEY, REFRESH_TOKEN_KEY, TOKEN_EXPIRES_KEY, EXPORT_DIRECTORY_KEY
+from move_bot.components.oauth_tokens import refresh_access_token
+from move_bot.components.namespace import EVENT, TIMELINE, MOVES_SEGMENT
+from move_bot.components.update_service.spatial_index import SpatialIndex
+from move_bot.components.update_service.location_handler import index_place
+from move_bot.components.update_service.jobs import Job, JobTracker
+from move_bot.components.update_service.profiler import UpdateProfiler
+from move_bot.components.update_service.sharding import ShardCoordinator, XmppShardTransport
+from move_bot.components.update_service.event_index import EventIndex
+from move_bot.components.update_service.ledger import IngestionLedger, ENRICHING
+from move_bot.components.update_service.place_enrichment import PlaceEnricher
+from move_bot.components.update_service.work_queue import SegmentWorkQueue, INCREMENTAL, BACKFILL
 import logging
 
 
@@ -28,6 +44,18 @@ class UpdateService(base_plugin):
 
     _delay = 600.0
     _past_days = 31
+    _max_range_days = 31
+    _place_radius = 50.0
+    _shard_lease = 60.0
+
+    # How often the expiry of the access token is checked, and how long before it expires that it is refreshed.
+    _token_check_interval = 3600.0
+    _token_refresh_margin = 2 * 86400.0
+
+    # Maximum number of segments per second processed for each class of work, None is unlimited.
+    _class_rates = {INCREMENTAL: None, BACKFILL: 2.0}
+
+    CYCLE_JOB = 'update_cycle'
 
     def plugin_init(self):
         """
@@ -35,6 +63,20 @@ class UpdateService(base_plugin):
         :return:
         """
         self.xmpp.add_event_handler(BotConfiguration.CONFIGURATION_RECEIVED_EVENT, self._configuration_updated)
+        self.spatial_index = SpatialIndex(radius=self._place_radius)
+        self._spatial_index_seeded = False
+        self.event_index = EventIndex()
+        self._event_index_seeding = False
+        self._jobs = JobTracker()
+        self._cycle_generation = 0
+        self.profiler = UpdateProfiler()
+        self.shard_coordinator = None
+        self._shard_peers = None
+        self._shard_heartbeat_scheduled = False
+        self._pending_plan = None
+        self._client = None
+        self._token_expires = None
+        self._token_check_scheduled = False
 
     def post_init(self):
         super(UpdateService, self).post_init()
@@ -43,6 +85,11 @@ class UpdateService(base_plugin):
         self._scheduler = self.xmpp['rho_bot_scheduler']
         self._configuration = self.xmpp['rho_bot_configuration']
         self._rdf_publish = self.xmpp['rho_bot_rdf_publish']
+        self._representation_manager = self.xmpp['rho_bot_representation_manager']
+        self.ledger = IngestionLedger(self._configuration)
+        self.place_enricher = PlaceEnricher(self.xmpp)
+        self.place_enricher.on_day_finished = self._day_enriched
+        self.work_queue = SegmentWorkQueue(self._scheduler, rates=self._class_rates)
 
     def fetch_for_month(self, date):
         """
@@ -50,49 +97,441 @@ class UpdateService(base_plugin):
         :param date: datetime.date object
         :return: promise
         """
-        promise = self._scheduler.defer(self._create_session)
+        month = date.strftime('%Y%m')
+        last_day = calendar.monthrange(date.year, date.month)[1]
+        job = Job('month:%s' % month, '%s01' % month, '%s%02d' % (month, last_day))
+
+        # If the month is already being fetched, there is no need to issue the work again.
+        active = self._jobs.covering(job)
+        if active:
+            logger.info('Merging %s into active job: %s' % (job, active))
+            return active.promise
+
+        self._jobs.add(job)
+
+        promise = self._scheduler.defer(lambda: self._create_session(job))
         promise = promise.then(self._build_client)
         promise = promise.then(self._get_owner)
         promise = promise.then(self._scheduler.generate_promise_handler(self._get_month_data, date))
         promise = promise.then(self._process_data)
 
+        promise.then(self._scheduler.generate_promise_handler(self._finish_job, job),
+                     self._scheduler.generate_promise_handler(self._finish_job, job))
+
+        job.promise = promise
+
+        return promise
+
+    def export_for_range(self, start_date, end_date, path):
+        """
+        Fetch data from the moves api for the date range provided and write it to the path as N-Triples rather than
+        creating each of the nodes through the storage client.
+        :param start_date: datetime.date object
+        :param end_date: datetime.date object
+        :param path: path of the file to write, relative to the configured export directory.
+        :return: promise
+        """
+        path = self._export_path(path)
+
+        promise = self._scheduler.defer(self._create_session)
+        promise = promise.then(self._build_client)
+        promise = promise.then(self._get_owner)
+        promise = promise.then(self._scheduler.generate_promise_handler(self._export_range, start_date, end_date,
+                                                                        path))
+
+        return promise
+
+    def import_archive(self, path):
+        """
+        Import the data from a Moves data export archive, rather than fetching it from the moves api.  The segments are
+        processed in the same way as the segments retrieved from the api.
+        :param path: path to the zipped export archive.
+        :return: promise
+        """
+        from move_bot.components.update_service.archive_reader import read_daily_places
+
+        job = Job('archive:%s' % os.path.abspath(path))
+
+        # If the archive is already being imported, there is no need to issue the work again.
+        active = self._jobs.find(job.name)
+        if active:
+            logger.info('Merging %s into active job: %s' % (job, active))
+            return active.promise
+
+        self._jobs.add(job)
+
+        promise = self._scheduler.defer(lambda: self._create_session(job))
+        promise = promise.then(self._get_owner)
+        promise = promise.then(self._scheduler.generate_promise_handler(self._import_days, read_daily_places(path)))
+
+        promise.then(self._scheduler.generate_promise_handler(self._finish_job, job),
+                     self._scheduler.generate_promise_handler(self._finish_job, job))
+
+        job.promise = promise
+
         return promise
 
     def _configuration_updated(self, *args, **kwargs):
         """
-        Callback when the configuration details have been received by the bot.
+        Callback when the configuration details have been received by the bot.  Any update cycle that is currently
+        running was started with the previous configuration, so it is cancelled before the next one is scheduled.
         :param args:
         :param kwargs:
         :return:
         """
+        cycle = self._jobs.find(self.CYCLE_JOB)
+        if cycle:
+            cycle.cancel()
+
+        # The stored ledger may have changed with the configuration.
+        self.ledger.reset()
+
+        self._configure_sharding()
+        self._seed_spatial_index()
+        self._seed_event_index()
+        self._schedule_cycle()
+
+        if not self._token_check_scheduled:
+            self._token_check_scheduled = True
+            self._scheduler.schedule_task(self._check_token, delay=self._token_check_interval, repeat=True)
+
+    def _seed_spatial_index(self):
+        """
+        Load the coordinates of the places that are already in the data store into the spatial index, so that places
+        stored before the bot was started are matched instead of being created again.  Only done once the data store
+        is available.  The places are requested one after the other, so that the storage bot is not flooded with a
+        request for every place at once.
+        :return:
+        """
+        if self._spatial_index_seeded or not self._storage_client.has_store():
+            return
+
+        self._spatial_index_seeded = True
+
+        request = StoragePayload()
+        request.add_type(WGS84_POS_NAMESPACE.SpatialThing)
+
+        def index_places(result):
+            logger.info('Seeding spatial index with %s places' % len(result.results))
+
+            promise = self._scheduler.promise()
+            promise.resolved(None)
+
+            for rdf in result.results:
+                step = functools.partial(index_place, self._storage_client, self.spatial_index, rdf.about)
+
+                # A place that can not be read does not stop the rest from being indexed.
+                promise = promise.then(lambda s, step=step: step(), lambda s, step=step: step())
+
+            return promise
+
+        def seed_failed(error):
+            logger.warning('Could not seed spatial index: %s' % error)
+            self._spatial_index_seeded = False
+
+        self._storage_client.find_nodes(request).then(index_places, seed_failed)
+
+    def _seed_event_index(self):
+        """
+        Load the moves events that are already in the data store into the event index, so that time range queries
+        cover the events stored before the bot was started.  The events are requested one after the other, and events
+        that have been ingested since the bot started are not replaced.
+        :return:
+        """
+        if self._event_index_seeding or self.event_index.seeded or not self._storage_client.has_store():
+            return
+
+        self._event_index_seeding = True
+
+        request = StoragePayload()
+        request.add_type(EVENT.Event)
+
+        def index_events(result):
+            logger.info('Seeding event index with %s events' % len(result.results))
+
+            promise = self._scheduler.promise()
+            promise.resolved(None)
+
+            for rdf in result.results:
+                step = functools.partial(self._index_stored_event, rdf.about)
+
+                # An event that can not be read does not stop the rest from being indexed.
+                promise = promise.then(lambda s, step=step: step(), lambda s, step=step: step())
+
+            return promise
+
+        def seeded(result):
+            logger.info('Event index seeded with %s events' % len(self.event_index))
+            self._event_index_seeding = False
+            self.event_index.seeded = True
+
+        def seed_failed(error):
+            logger.warning('Could not seed event index: %s' % error)
+            self._event_index_seeding = False
+
+        self._storage_client.find_nodes(request).then(index_events).then(seeded, seed_failed)
+
+    def _index_stored_event(self, event):
+        """
+        Read the interval and place of a stored event and add it to the event index.  Only events created from moves
+        segments are indexed.
+        :param event: uri of the event.
+        :return: promise
+        """
+        request = StoragePayload()
+        request.about = event
+
+        def read_interval(result):
+            segments = [value for value in result.properties.get(str(RDFS.seeAlso), [])
+                        if str(value).startswith(str(MOVES_SEGMENT))]
+            intervals = result.references.get(str(EVENT.time), None)
+
+            if not segments or not intervals or event in self.event_index:
+                return None
+
+            places = result.references.get(str(EVENT.place), None)
+
+            interval_request = StoragePayload()
+            interval_request.about = intervals[0]
+
+            def index_interval(interval):
+                start = interval.properties.get(str(TIMELINE.start), None)
+                end = interval.properties.get(str(TIMELINE.end), None)
+
+                if start and end and event not in self.event_index:
+                    self.event_index.add(event, str(start[0]), str(end[0]), places[0] if places else None)
+
+            return self._storage_client.get_node(interval_request).then(index_interval)
+
+        return self._storage_client.get_node(request).then(read_interval)
+
+    def _check_token(self):
+        """
+        Refresh the access token if it is going to expire soon, so that the update cycles never fail because of an
+        expired token.
+        :return:
+        """
+        expires = self._token_expires
+        if expires is None:
+            expires = self._configuration.get_value(key=TOKEN_EXPIRES_KEY, default=None, persist_if_missing=False)
+
+        if expires is None or float(expires) - time.time() > self._token_refresh_margin:
+            return
+
+        logger.info('Access token expires at %s, refreshing' % expires)
+
+        try:
+            self._refresh_token()
+        except Exception:
+            logger.exception('Could not refresh the access token')
+
+    def _refresh_token(self):
+        """
+        Use the refresh token to get a new access token, store it, and replace the client used by the update cycles.
+        :return: the new client.
+        """
+        configuration = self._configuration.get_configuration()
+        identifier = configuration.get(IDENTIFIER_KEY, None)
+        secret = configuration.get(CLIENT_SECRET_KEY, None)
+        refresh_token = configuration.get(REFRESH_TOKEN_KEY, None)
+
+        if identifier is None or secret is None or refresh_token is None:
+            raise RuntimeError('Refresh token is not defined')
+
+        tokens = refresh_access_token(identifier, secret, refresh_token)
+
+        import moves
+        client = moves.MovesClient(identifier, secret, tokens[CLIENT_TOKEN_KEY])
+
+        self._configuration.merge_configuration(tokens)
+
+        # Swap in the new client as a single assignment, cycles that are running keep the client in their session.
+        self._token_expires = float(tokens[TOKEN_EXPIRES_KEY]) if TOKEN_EXPIRES_KEY in tokens else None
+        self._client = client
+
+        logger.info('Access token refreshed')
+
+        return client
+
+    def _configure_sharding(self):
+        """
+        Look in the configuration for the peers that share the processing of the update cycles, and coordinate with them
+        over xmpp if there are any.
+        :return:
+        """
+        peers = self._configuration.get_value(key=SHARD_PEERS_KEY, default=None, persist_if_missing=False)
+        peers = sorted(peer.strip() for peer in peers.split(',') if peer.strip()) if peers else None
+
+        if peers == self._shard_peers:
+            return
+
+        self._shard_peers = peers
+
+        if self.shard_coordinator:
+            self.shard_coordinator.close()
+            self.shard_coordinator = None
+
+        if peers:
+            transport = XmppShardTransport(self.xmpp, peers)
+            self.enable_sharding(ShardCoordinator(self.xmpp.boundjid.bare, transport,
+                                                  lease_duration=self._shard_lease))
+
+    def enable_sharding(self, coordinator):
+        """
+        Share the processing of the update cycles with the other members known to the coordinator.
+        :param coordinator: ShardCoordinator
+        :return:
+        """
+        self.shard_coordinator = coordinator
+        coordinator.on_plan = self._plan_received
+        coordinator.on_commit = self._shard_committed
+        coordinator.heartbeat()
+
+        if not self._shard_heartbeat_scheduled:
+            self._shard_heartbeat_scheduled = True
+            self._scheduler.schedule_task(self._shard_heartbeat, delay=self._shard_lease / 3.0, repeat=True)
+
+    def _shard_heartbeat(self):
+        """
+        Renew the lease of this instance in the shard group.
+        :return:
+        """
+        if self.shard_coordinator:
+            self.shard_coordinator.heartbeat()
+
+    def _plan_received(self, plan):
+        """
+        Callback when the committer has published the plan of a cycle, process the days of the plan owned by this
+        instance.  If a cycle is already running, the plan is started once it has finished.
+        :param plan: ShardPlan
+        :return:
+        """
+        logger.info('Received shard plan: %s' % plan)
+
+        if self._jobs.find(self.CYCLE_JOB):
+            self._pending_plan = plan
+            return
+
+        self._start(plan=plan)
+
+    def _shard_committed(self, last_update):
+        """
+        Callback when every member has completed the plan of a cycle.  The last_update is stored by all of the members,
+        so that whichever of them becomes the committer continues from it.
+        :param last_update: last_update that was completed.
+        :return:
+        """
+        committed = self._configuration.get_value(key='last_update', default=None, persist_if_missing=False)
+        if committed is None or committed < last_update:
+            logger.info('Committing shard last_update: %s' % last_update)
+            self._configuration.merge_configuration({'last_update': last_update})
+
+    def _schedule_cycle(self):
+        """
+        Schedule the next update cycle.  Only the most recently scheduled cycle will be started, any cycles that were
+        scheduled before it are ignored when they fire.
+        :return:
+        """
+        self._cycle_generation += 1
         logger.debug('Rescheduling task for time: %s' % self._delay)
-        self._scheduler.schedule_task(self._start, delay=self._delay, repeat=False)
+        self._scheduler.schedule_task(functools.partial(self._start, self._cycle_generation), delay=self._delay,
+                                      repeat=False)
 
-    def _start(self):
+    def _start(self, generation=None, plan=None):
         """
         Entry point.
 
         Generates the basic chain of promises that will be used.  Each of the promises should return the session
         variable that will be updated by all of the individual tasks so that each of the following tasks will have
         access to all of the work that has been done before it.
+        :param generation: generation of the schedule request that started the cycle.
+        :param plan: shard plan published by the committer that the cycle is processing.
         :return:
         """
-        promise = self._scheduler.defer(self._create_session)
+        if generation is not None and generation != self._cycle_generation:
+            logger.debug('Ignoring stale update cycle: %s' % generation)
+            return
+
+        if self._jobs.find(self.CYCLE_JOB):
+            # The running cycle may have been cancelled and will not reschedule itself, so try again later.
+            logger.info('Update cycle is already running')
+            self._schedule_cycle()
+            return
+
+        if plan is None and self.shard_coordinator and not self.shard_coordinator.is_committer():
+            # The cycles of the other members are started by the plans of the committer, the schedule is only kept so
+            # that this instance takes over if it becomes the committer.
+            logger.debug('Waiting for the shard plan of the committer')
+            self._schedule_cycle()
+            return
+
+        job = Job(self.CYCLE_JOB)
+        self._jobs.add(job)
+        self.profiler.cycle_started()
+
+        promise = self._scheduler.defer(lambda: self._create_session(job, plan))
         promise = promise.then(self._build_client)
         promise = promise.then(self._get_owner)
         promise = promise.then(self._get_data)
         promise = promise.then(self._process_data)
 
+        job.promise = promise
+
         # Reschedule the whole thing again
-        promise.then(self._configuration_updated, self._configuration_updated)
+        promise.then(self._scheduler.generate_promise_handler(self._finish_cycle, job),
+                     self._scheduler.generate_promise_handler(self._finish_cycle, job))
+
+    def _finish_job(self, result, job):
+        """
+        Remove the job from the active jobs once it has completed.
+        :param result: result of the job.
+        :param job: job that completed.
+        :return: result
+        """
+        logger.debug('Finished job: %s' % job)
+        self._jobs.remove(job)
+
+        for day in job.pending_days:
+            self.ledger.fail(day)
+        self.ledger.save()
 
-    def _create_session(self):
+        self.profiler.job_finished(job, cycle=job.name == self.CYCLE_JOB)
+        return result
+
+    def _finish_cycle(self, result, job):
+        """
+        Remove the update cycle from the active jobs and schedule the next one.  A cancelled cycle has already had its
+        replacement scheduled.
+        :param result: result of the cycle.
+        :param job: job of the cycle.
+        :return:
+        """
+        self._finish_job(result, job)
+
+        if not job.cancelled:
+            self._schedule_cycle()
+
+        if self._pending_plan:
+            plan, self._pending_plan = self._pending_plan, None
+            self._start(plan=plan)
+
+    def _create_session(self, job=None, plan=None):
         """
         Creates the session variable that will be used throughout all of the promises.
+        :param job: job that the session is executing for.
+        :param plan: shard plan that the session is executing for.
         :return: session dictionary
         """
         logger.debug('Creating session')
-        return dict()
+        session = dict()
+
+        if job:
+            session['job'] = job
+
+        if plan:
+            session['plan'] = plan
+
+        return session
 
     def _build_client(self, session):
         """
@@ -118,18 +557,33 @@ class UpdateService(base_plugin):
             logger.error('Storage Client doesnt exist')
             raise RuntimeError('Storage Client doesn\'t exist')
 
+        # Reuse the client as long as it was built from the current client details and token, the moves library is
+        # only needed once a client is built.
+        client = self._client
+        if client is None or (client.client_id, client.client_secret, client.access_token) != \
+                (identifier, secret, client_token):
+            import moves
+            client = moves.MovesClient(identifier, secret, client_token)
+
         # Validate the token
-        client = moves.MovesClient(identifier, secret, client_token)
         token_validity = client.tokeninfo()
 
+        if 'error' in token_validity and configuration.get(REFRESH_TOKEN_KEY, None):
+            logger.warning('Token is not valid, refreshing')
+            client = self._refresh_token()
+            token_validity = client.tokeninfo()
+
         if 'error' in token_validity:
             logger.error('Token is not valid')
             raise RuntimeError('Token is not valid')
 
         # if all is good with the world, start executing the update thread.
-        # Determine if the token should be updated or not
         logger.debug('Token Validity Information: %s' % token_validity)
 
+        if 'expires_in' in token_validity:
+            self._token_expires = time.time() + float(token_validity['expires_in'])
+
+        self._client = client
         session['client'] = client
 
         return session
@@ -165,29 +619,112 @@ class UpdateService(base_plugin):
         logger.debug('Task Executing: %s' % session)
         session['segments'] = []
 
+        plan = session.get('plan', None)
+        if plan is not None:
+            # Cycle of another member's plan, only the days that this instance owns are fetched.
+            if plan.since:
+                session['last_update'] = plan.since
+
+            self._fetch_days(session, plan.owned_days(self.shard_coordinator.identity))
+            return session
+
         parameters = dict(pastDays=self._past_days)
 
         last_update = self._configuration.get_value(key='last_update', default=None,
                                                     persist_if_missing=False)
+
+        changed_days = None
         if last_update:
             parameters['updatedSince'] = last_update
             session['last_update'] = last_update
 
+            # Ask the cheaper summary endpoint which days changed, and only fetch the places for those days.
+            changed_days = self._probe_changed_days(session['client'], parameters, self.ledger)
+            if changed_days is not None:
+                logger.info('Changed days: %s' % changed_days)
+
+        if self.shard_coordinator:
+            # The committer decides the days of the cycle, and publishes them with the members that share them.
+            if changed_days is None:
+                today = datetime.date.today()
+                changed_days = [(today - datetime.timedelta(days=offset)).strftime('%Y%m%d')
+                                for offset in range(self._past_days)]
+
+            plan = self.shard_coordinator.publish_plan(changed_days, since=last_update)
+            session['plan'] = plan
+            changed_days = plan.owned_days(self.shard_coordinator.identity)
+            logger.info('Processing %s of %s days in this shard' % (len(changed_days), len(plan.days)))
+
+        if changed_days is not None:
+            self._fetch_days(session, changed_days)
+            return session
+
         results = session['client'].user_places_daily(**parameters)
 
         logger.debug('Update Results: %s' % results)
 
-        for date_result in results:
-            segments = date_result['segments']
+        self._store_results(session, results)
 
-            if session.get('last_update', None) is None or session['last_update'] < date_result['lastUpdate']:
-                session['last_update'] = date_result['lastUpdate']
+        return session
 
-            if segments is not None:
-                for segment in segments:
-                    session['segments'].append(segment)
+    def _fetch_days(self, session, days):
+        """
+        Fetch the places of each of the days and store them in the session variable.
+        :param session: session variable.
+        :param days: sorted list of day strings.
+        :return:
+        """
+        for start_day, end_day in self._day_ranges(days):
+            results = session['client'].user_places_daily(**{'from': start_day, 'to': end_day})
 
-        return session
+            logger.debug('Update Results: %s' % results)
+
+            self._store_results(session, results)
+
+    @staticmethod
+    def _probe_changed_days(client, parameters, ledger):
+        """
+        Use the daily summary to determine which of the days have been updated since the last update.  Days that the
+        ledger shows have already been ingested at their current lastUpdate are skipped.
+        :param client: moves client.
+        :param parameters: parameters of the places request, including updatedSince.
+        :param ledger: ingestion ledger.
+        :return: sorted list of day strings, or None if the days could not be determined.
+        """
+        try:
+            summaries = client.user_summary_daily(**parameters)
+        except Exception:
+            logger.exception('Could not probe for changed days')
+            return None
+
+        changed_days = set()
+        for summary in summaries or []:
+            last_update = summary.get('lastUpdate', None)
+            if last_update is None or last_update > parameters['updatedSince']:
+                if not ledger.is_complete(summary['date'], last_update):
+                    changed_days.add(summary['date'])
+
+        return sorted(changed_days)
+
+    def _day_ranges(self, days):
+        """
+        Group the days into ranges of consecutive days that can each be requested in a single request.
+        :param days: sorted list of day strings in the form YYYYMMDD.
+        :return: list of (from, to) day strings.
+        """
+        ranges = []
+        for day in days:
+            date = datetime.datetime.strptime(day, '%Y%m%d').date()
+
+            if ranges:
+                start_date, end_date = ranges[-1]
+                if date - end_date == datetime.timedelta(days=1) and (date - start_date).days < self._max_range_days:
+                    ranges[-1] = (start_date, date)
+                    continue
+
+            ranges.append((date, date))
+
+        return [(start_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d')) for start_date, end_date in ranges]
 
     def _get_month_data(self, session, date):
         """
@@ -199,11 +736,32 @@ class UpdateService(base_plugin):
         logger.debug('Task Executing: %s' % session)
         session['segments'] = []
 
-        query_string = date.strftime('%Y%m')
+        # Only the days of the month that the ledger does not show as completely ingested are fetched.
+        end_date = min(date.replace(day=calendar.monthrange(date.year, date.month)[1]), datetime.date.today())
+        gaps = self.ledger.gaps(date.replace(day=1), end_date)
+        days = []
+        for start_day, end_day, status in gaps:
+            day = datetime.datetime.strptime(start_day, '%Y%m%d').date()
+            while day.strftime('%Y%m%d') <= end_day:
+                days.append(day.strftime('%Y%m%d'))
+                day += datetime.timedelta(days=1)
 
-        results = session['client'].user_places_daily(query_string)
+        logger.info('Fetching %s days of %s not in the ledger' % (len(days), date.strftime('%Y%m')))
 
-        logger.debug('Update Results: %s' % results)
+        self._fetch_days(session, days)
+
+        return session
+
+    @staticmethod
+    def _store_results(session, results):
+        """
+        Copy the segments out of the daily results into the session variable, keeping track of the latest update.
+        :param session: session variable.
+        :param results: daily results from the API.
+        :return:
+        """
+        days = session.setdefault('days', {})
+        segment_days = session.setdefault('segment_days', {})
 
         for date_result in results:
             segments = date_result['segments']
@@ -211,10 +769,112 @@ class UpdateService(base_plugin):
             if session.get('last_update', None) is None or session['last_update'] < date_result['lastUpdate']:
                 session['last_update'] = date_result['lastUpdate']
 
+            days[date_result['date']] = dict(last_update=date_result['lastUpdate'], segment_count=len(segments or []))
+
             if segments is not None:
                 for segment in segments:
+                    segment_days[id(segment)] = date_result['date']
                     session['segments'].append(segment)
 
+    @staticmethod
+    def _segment_day(session, segment):
+        """
+        Determine the day that the segment was provided for, which is not always the day that the segment started.
+        :param session: session variable.
+        :param segment: segment
+        :return: day string in the form YYYYMMDD
+        """
+        return session.get('segment_days', {}).get(id(segment), segment['startTime'][:8])
+
+    def _export_path(self, path):
+        """
+        Resolve the path requested for an export inside of the configured export directory.  Absolute paths, paths
+        that leave the directory, and files that already exist are refused.
+        :param path: relative path of the file to write.
+        :return: absolute path of the file.
+        """
+        directory = self._configuration.get_value(key=EXPORT_DIRECTORY_KEY, default=None, persist_if_missing=False)
+        if not directory:
+            raise ValueError('Export directory is not configured')
+
+        if not path or os.path.isabs(path) or '..' in path.replace('\\', '/').split('/'):
+            raise ValueError('Export path must be relative to the export directory: %s' % path)
+
+        directory = os.path.realpath(directory)
+        resolved = os.path.realpath(os.path.join(directory, path))
+        if not resolved.startswith(directory + os.sep):
+            raise ValueError('Export path is outside of the export directory: %s' % path)
+
+        if os.path.exists(resolved):
+            raise ValueError('Export file already exists: %s' % path)
+
+        return resolved
+
+    def _export_range(self, session, start_date, end_date, path):
+        """
+        Retrieve the data for all of the days between the start and end date (inclusive) and write it to the path as
+        N-Triples, so that it can be loaded into the data store in a single operation instead of creating each of the
+        nodes individually.  The API limits the size of the range that can be requested, so the range is broken into
+        windows, and each window is fetched and written in its own task so that the bot keeps handling other events
+        between them.
+        :param session: session variable.
+        :param start_date: datetime.date object
+        :param end_date: datetime.date object
+        :param path: absolute path of the file to write, which must not exist yet.
+        :return: promise that provides the session variable
+        """
+        from move_bot.components.update_service.bulk_export import SegmentTripleWriter
+
+        logger.debug('Task Executing: %s' % session)
+
+        session['writer'] = SegmentTripleWriter(session['owner'], self._representation_manager.representation_uri)
+        session['triple_count'] = 0
+
+        # Created exclusively, so that a file that appeared since the path was checked is not overwritten.
+        stream = io.open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL), 'w', encoding='utf-8')
+
+        promise = self._scheduler.promise()
+        promise.resolved(session)
+
+        window_start = start_date
+        while window_start <= end_date:
+            window_end = min(end_date, window_start + datetime.timedelta(days=self._max_range_days - 1))
+
+            window = functools.partial(self._export_window, session, stream, window_start, window_end)
+            promise = promise.then(lambda s, window=window: self._scheduler.defer(window))
+
+            window_start = window_end + datetime.timedelta(days=1)
+
+        def close(result):
+            stream.close()
+            return result
+
+        def close_failed(error):
+            stream.close()
+            failed = self._scheduler.promise()
+            failed.rejected(error)
+            return failed
+
+        return promise.then(close, close_failed)
+
+    @staticmethod
+    def _export_window(session, stream, start_date, end_date):
+        """
+        Fetch a single window of the export and write its triples.
+        :param session: session variable.
+        :param stream: file being written.
+        :param start_date: datetime.date object
+        :param end_date: datetime.date object
+        :return: session variable
+        """
+        results = session['client'].user_places_daily(**{'from': start_date.strftime('%Y%m%d'),
+                                                          'to': end_date.strftime('%Y%m%d')})
+
+        logger.debug('Update Results: %s' % results)
+
+        for date_result in results:
+            session['triple_count'] += session['writer'](date_result['segments'] or [], stream)
+
         return session
 
     def _process_data(self, session):
@@ -227,14 +887,7 @@ class UpdateService(base_plugin):
         """
         session['promise'] = self._scheduler.promise()
 
-        promise = None
-        for segment in session['segments']:
-            if not promise:
-                execution = ProcessSegment(segment, session['owner'], self.xmpp)
-                promise = self._scheduler.defer(execution)
-            else:
-                execution = ProcessSegment(segment, session['owner'], self.xmpp)
-                promise = promise.then(execution)
+        promise = self._queue_segments(session)
 
         # Save off the configuration details from this update cycle, and then resolve or reject the session promise.
         if promise is not None:
@@ -242,10 +895,181 @@ class UpdateService(base_plugin):
                 lambda s: self._update_configuration(session)).then(lambda s: session['promise'].resolved(session),
                                                                     lambda s: session['promise'].rejected(s))
         else:
+            if self._is_shard_cycle(session):
+                # Nothing in this shard, but the other members still need to know that it has been completed.
+                self._update_configuration(session)
+
             session['promise'].resolved(session)
 
         return session['promise']
 
+    def _is_shard_cycle(self, session):
+        """
+        Determine if the session is an update cycle whose work is shared with other members.
+        :param session: session variable.
+        :return:
+        """
+        return self.shard_coordinator is not None and session.get('plan', None) is not None
+
+    def _queue_segments(self, session):
+        """
+        Queue each of the segments in the session to be processed by the work queue.  Segments of update cycles are
+        queued ahead of the segments of backfills.
+        :param session: session variable.
+        :return: promise resolved once all of the segments have been processed, or None if there are no segments.
+        """
+        from move_bot.components.update_service.process_segment import ProcessSegment
+
+        job = session.get('job', None)
+        segments = session['segments']
+
+        if job:
+            # Segments of days that another job is already processing are left to that job.  The update cycle commits
+            # last_update past all of the days that it fetched, so it takes its days over from backfills instead.
+            take_over = job.name == self.CYCLE_JOB
+            claimed = [segment for segment in segments
+                       if self._jobs.claim(job, self._segment_day(session, segment), take_over=take_over)]
+            if len(claimed) != len(segments):
+                logger.info('Skipping %s segments claimed by other jobs' % (len(segments) - len(claimed)))
+            segments = claimed
+
+        # Days whose segments are all being processed by this job are recorded in the ledger after their last segment.
+        last_segments = {}
+        if job:
+            counts = {}
+            for segment in segments:
+                day = self._segment_day(session, segment)
+                counts[day] = counts.get(day, 0) + 1
+                last_segments[day] = segment
+
+            for day, details in session.get('days', {}).items():
+                if details['segment_count'] == 0:
+                    self.ledger.complete(day, details['last_update'], 0)
+                elif counts.get(day, 0) == details['segment_count']:
+                    job.pending_days.add(day)
+                else:
+                    last_segments.pop(day, None)
+
+            last_segments = dict((id(segment), day) for day, segment in last_segments.items())
+
+        # Checked after the ledger, so that days without any segments are still recorded.
+        if not segments:
+            return None
+
+        items = []
+        for segment in segments:
+            day = self._segment_day(session, segment)
+            execution = self._guard_segment(ProcessSegment(segment, session['owner'], self.xmpp, day), job, day)
+
+            after = None
+            if id(segment) in last_segments:
+                after = functools.partial(self._complete_day, session, last_segments[id(segment)])
+
+            items.append((execution, after))
+
+        priority = INCREMENTAL if job and job.name == self.CYCLE_JOB else BACKFILL
+
+        return self.work_queue.submit(items, priority)
+
+    def _complete_day(self, session, day):
+        """
+        Record in the ledger that all of the segments of the day have been processed.  If the places of the events of
+        the day are still being resolved, the day is only complete once they have been.  The ledger is saved straight
+        away, so that the days of a long backfill are not lost if the bot restarts before the backfill finishes.
+        :param session: session variable.
+        :param day: day string.
+        :return:
+        """
+        job = session['job']
+        if day not in job.pending_days:
+            # The day was taken over by another job, which will record it.
+            return
+
+        details = session['days'][day]
+        enrichment = self.place_enricher.day_state(day)
+
+        if enrichment == PlaceEnricher.PENDING:
+            self.ledger.enriching(day, details['last_update'], details['segment_count'])
+        elif enrichment == PlaceEnricher.FAILED:
+            self.ledger.fail(day)
+            self.place_enricher.forget_day(day)
+        else:
+            self.ledger.complete(day, details['last_update'], details['segment_count'])
+
+        job.pending_days.discard(day)
+        self.ledger.save()
+
+    def _day_enriched(self, day, success):
+        """
+        Callback when the places of all of the events of a day have been handled by the place enricher.
+        :param day: day string.
+        :param success: True if all of the places were stored.
+        :return:
+        """
+        entry = self.ledger.get(day)
+        if entry is None or entry.status != ENRICHING:
+            # The segments of the day are still being processed, the result is recorded once they are.
+            return
+
+        if success:
+            self.ledger.complete(day, entry.last_update, entry.segment_count)
+        else:
+            self.ledger.fail(day)
+            self.place_enricher.forget_day(day)
+
+        self.ledger.save()
+
+    def _guard_segment(self, execution, job, day=None):
+        """
+        Wrap the segment execution so that the job stops before the segment if the job has been cancelled, so that
+        the segment is skipped if its day has been taken over by another job, and so that the profiler is notified of
+        the segment.
+        :param execution: segment callable.
+        :param job: job that the segment is executing for, or None.
+        :param day: day that the segment was provided for.
+        :return: callable
+        """
+        def guarded(*args):
+            if job:
+                job.check()
+
+                if day is not None and day not in job.days:
+                    logger.debug('Skipping segment of %s, taken over by another job' % day)
+                    return None
+
+            self.profiler.segment_started(job)
+            return execution(*args)
+
+        return guarded
+
+    def _import_days(self, session, days):
+        """
+        Process the segments of the next day provided by the days generator, and once they have all been processed
+        move on to the day after it.  Only a single day of segments is held in the session at a time.
+        :param session: session variable.
+        :param days: generator of daily results.
+        :return: promise that will be resolved once all of the days have been processed.
+        """
+        session['segments'] = []
+        session['days'] = {}
+
+        for date_result in days:
+            self._store_results(session, [date_result])
+
+            if session['segments']:
+                break
+
+        promise = self._queue_segments(session)
+
+        if promise is None:
+            promise = self._scheduler.promise()
+            promise.resolved(session)
+            return promise
+
+        session['segment_count'] = session.get('segment_count', 0) + len(session['segments'])
+
+        return promise.then(lambda s: self._import_days(session, days))
+
     def _update_configuration(self, session):
         """
         Used to update the internal configuration details of the bot so that data isn't pulled down that hasn't been
@@ -253,9 +1077,21 @@ class UpdateService(base_plugin):
         :param session: session variable.
         :return: session variable
         """
-        self._configuration.merge_configuration({'last_update': session['last_update']})
+        if self._is_shard_cycle(session):
+            self._commit_shard(session)
+        else:
+            self._configuration.merge_configuration({'last_update': session['last_update']})
 
         return session
 
+    def _commit_shard(self, session):
+        """
+        Report that the days of the plan owned by this instance have been processed.  The committer of the plan stores
+        last_update once every member has reported.
+        :param session: session variable.
+        :return:
+        """
+        self.shard_coordinator.report(session['plan'], session.get('last_update', None))
+
 
 update_service = UpdateService
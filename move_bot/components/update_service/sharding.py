@@ -0,0 +1,354 @@
+"""
+Coordination of several move_bot instances that share the processing of the update cycles.
+
+Each instance announces itself with a heartbeat that holds a lease on its membership for a fixed duration.  The first
+live member is the committer, and it is the only member that starts update cycles on its own.  At the start of each
+cycle the committer publishes a plan that lists the members taking part in the cycle and the days that have to be
+fetched, and each day is owned by the plan member that the day hashes to.  Since every member partitions the days with
+the member list of the plan, each day is processed by exactly one member.  The other members run a cycle for their
+own days as soon as they receive the plan, and report back once they are done.  The committer only advances
+last_update once every member of the plan has reported that all of its days have been processed.
+"""
+import json
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+SHARD_SUBJECT = 'move_bot::shard'
+
+HEARTBEAT = 'heartbeat'
+PLAN = 'plan'
+DONE = 'done'
+COMMITTED = 'committed'
+
+
+class MemberLease:
+    """
+    Membership that has been announced by a member of the shard group.
+    """
+
+    def __init__(self, member):
+        self.member = member
+        self.expires = 0.0
+
+
+class ShardPlan:
+    """
+    Members and days of a single update cycle, published by the committer of the cycle.
+    """
+
+    def __init__(self, cycle, members, days, since=None):
+        """
+        Construct the plan.
+        :param cycle: identifier of the cycle.
+        :param members: sorted list of the members taking part in the cycle, the first member is the committer.
+        :param days: list of day strings in the form YYYYMMDD that have to be fetched.
+        :param since: last_update that the days were determined from.
+        """
+        self.cycle = cycle
+        self.members = list(members)
+        self.days = sorted(days)
+        self.since = since
+
+    def __repr__(self):
+        return 'ShardPlan(%s, %s, %s days)' % (self.cycle, self.members, len(self.days))
+
+    @property
+    def committer(self):
+        return self.members[0]
+
+    def owner(self, day):
+        """
+        Determine the member that is responsible for processing the day.
+        :param day: day string in the form YYYYMMDD.
+        :return: member
+        """
+        index = (zlib.crc32(day.encode('utf-8')) & 0xffffffff) % len(self.members)
+        return self.members[index]
+
+    def owned_days(self, member):
+        """
+        Days of the plan that the member is responsible for.
+        :param member: member
+        :return: sorted list of day strings.
+        """
+        return [day for day in self.days if self.owner(day) == member]
+
+    def to_message(self):
+        return dict(type=PLAN, cycle=self.cycle, members=self.members, days=self.days, since=self.since)
+
+    @classmethod
+    def from_message(cls, message):
+        return cls(message['cycle'], message['members'], message['days'], message.get('since', None))
+
+
+class ShardCoordinator:
+    """
+    Keeps track of the members of the shard group and of the progress of the plan of the current cycle.
+
+    on_plan is called with each plan published by the committer that this instance takes part in, and on_commit is
+    called with the last_update once the plan has been completed by all of its members.
+    """
+
+    def __init__(self, identity, transport, lease_duration=60.0, clock=time.time):
+        """
+        Construct the coordinator.
+        :param identity: identifier of this instance, the bare jid of the bot.
+        :param transport: transport used to send messages to the other members.
+        :param lease_duration: number of seconds that a heartbeat keeps a member in the group.
+        :param clock: callable that provides the current time.
+        """
+        self.identity = identity
+        self.lease_duration = lease_duration
+        self.on_plan = None
+        self.on_commit = None
+        self._transport = transport
+        self._clock = clock
+        self._leases = {}
+        self._cycle_counter = int(clock() * 1000)
+
+        # Plan published by this instance, and the reports of its members.
+        self._plan = None
+        self._reports = {}
+        self._plan_committed = False
+
+        # Committer of the last plan received from another member.
+        self._plan_committer = None
+
+        transport.register(self)
+
+    def close(self):
+        self._transport.close()
+
+    def _lease(self, member):
+        if member not in self._leases:
+            self._leases[member] = MemberLease(member)
+
+        return self._leases[member]
+
+    def heartbeat(self):
+        """
+        Renew the lease of this instance and announce it to the other members.
+        :return:
+        """
+        self._lease(self.identity).expires = self._clock() + self.lease_duration
+        self._transport.send(dict(type=HEARTBEAT, duration=self.lease_duration))
+
+    def handle(self, message, sender):
+        """
+        Process a message from another member.
+        :param message: dictionary sent by the other member.
+        :param sender: identity of the member that sent the message, as verified by the transport.
+        :return:
+        """
+        if sender == self.identity:
+            return
+
+        message_type = message.get('type', None)
+
+        if message_type == HEARTBEAT:
+            # The expiry is measured on the local clock, so that the clocks of the members do not need to agree.
+            self._lease(sender).expires = self._clock() + message['duration']
+        elif message_type == PLAN:
+            self._handle_plan(ShardPlan.from_message(message), sender)
+        elif message_type == DONE:
+            self._handle_done(message, sender)
+        elif message_type == COMMITTED:
+            if sender == self._plan_committer and self.on_commit:
+                self.on_commit(message['last_update'])
+        else:
+            logger.warning('Unknown shard message from %s: %s' % (sender, message))
+
+    def members(self):
+        """
+        The sorted list of members that currently hold a lease.  This instance is always considered a member.
+        :return:
+        """
+        now = self._clock()
+        live = set(lease.member for lease in self._leases.values() if lease.expires > now)
+        live.add(self.identity)
+
+        return sorted(live)
+
+    def is_committer(self):
+        return self.members()[0] == self.identity
+
+    def publish_plan(self, days, since=None):
+        """
+        Publish the plan of a new cycle to the live members.  Any plan that was published before it is abandoned, and
+        will never be committed.
+        :param days: list of day strings that have to be fetched in the cycle.
+        :param since: last_update that the days were determined from.
+        :return: ShardPlan
+        """
+        self._cycle_counter += 1
+        plan = ShardPlan('%s:%s' % (self.identity, self._cycle_counter), self.members(), days, since)
+
+        self._plan = plan
+        self._reports = {}
+        self._plan_committed = False
+
+        logger.debug('Publishing shard plan: %s' % plan)
+        self._transport.send(plan.to_message())
+
+        return plan
+
+    def _handle_plan(self, plan, sender):
+        """
+        Start the cycle of a plan published by the committer of the plan.
+        :param plan: ShardPlan
+        :param sender: member that sent the plan.
+        :return:
+        """
+        if sender != plan.committer:
+            logger.warning('Ignoring shard plan %s not sent by its committer: %s' % (plan, sender))
+            return
+
+        if self.identity not in plan.members:
+            logger.debug('Not a member of shard plan: %s' % plan)
+            return
+
+        self._plan_committer = sender
+
+        if self.on_plan:
+            self.on_plan(plan)
+
+    def report(self, plan, last_update):
+        """
+        Announce that this instance has processed all of the days that it owns in the plan.
+        :param plan: ShardPlan
+        :param last_update: latest last_update of the days that were processed.
+        :return:
+        """
+        days = plan.owned_days(self.identity)
+
+        if plan.committer == self.identity:
+            self._record_report(plan.cycle, self.identity, days, last_update)
+        else:
+            self._transport.send(dict(type=DONE, cycle=plan.cycle, days=days, last_update=last_update))
+
+    def _handle_done(self, message, sender):
+        self._record_report(message['cycle'], sender, message['days'], message.get('last_update', None))
+
+    def _record_report(self, cycle, member, days, last_update):
+        """
+        Store the report of a member of the plan, and commit the plan if it is now complete.
+        :return:
+        """
+        if self._plan is None or cycle != self._plan.cycle:
+            logger.debug('Ignoring report of old cycle from %s: %s' % (member, cycle))
+            return
+
+        if member not in self._plan.members:
+            logger.warning('Ignoring report from %s, not a member of %s' % (member, self._plan))
+            return
+
+        self._reports[member] = (set(days), last_update)
+
+        watermark = self.watermark()
+        if watermark is not None and not self._plan_committed:
+            self._plan_committed = True
+            self._transport.send(dict(type=COMMITTED, cycle=cycle, last_update=watermark))
+
+            if self.on_commit:
+                self.on_commit(watermark)
+
+    def watermark(self):
+        """
+        Determine the last_update that can be committed for the plan published by this instance.  This is only
+        available once every member of the plan has reported, and every day of the plan is covered by the report of
+        the member that owns it.
+        :return: last_update or None if it can not be committed yet.
+        """
+        plan = self._plan
+        if plan is None:
+            return None
+
+        for member in plan.members:
+            if member not in self._reports:
+                return None
+
+        for day in plan.days:
+            if day not in self._reports[plan.owner(day)][0]:
+                return None
+
+        values = [last_update for days, last_update in self._reports.values() if last_update is not None]
+        if plan.since is not None:
+            values.append(plan.since)
+
+        return max(values) if values else None
+
+
+class XmppShardTransport:
+    """
+    Transport that sends the messages to each of the peer bots.  Only messages sent by one of the peers are accepted,
+    and the sender is identified by the jid the message came from rather than by anything in its body.
+
+    The messages are sent as headlines, which servers do not store for offline peers, so that a member that reconnects
+    is not handed stale heartbeats and plans that would keep dead members alive or restart abandoned cycles.
+    """
+
+    def __init__(self, xmpp, peers):
+        """
+        Construct the transport.
+        :param xmpp: bot that sends the messages.
+        :param peers: list of the jids of the members.
+        """
+        self.xmpp = xmpp
+        self._peers = peers
+        self._coordinator = None
+
+    def register(self, coordinator):
+        self._coordinator = coordinator
+        self.xmpp.add_event_handler('message', self._handle_message)
+
+    def close(self):
+        self.xmpp.del_event_handler('message', self._handle_message)
+
+    def send(self, message):
+        body = json.dumps(message)
+        for peer in self._peers:
+            if peer != self._coordinator.identity:
+                self.xmpp.send_message(mto=peer, msubject=SHARD_SUBJECT, mbody=body, mtype='headline')
+
+    def _handle_message(self, message):
+        if message['subject'] != SHARD_SUBJECT:
+            return
+
+        sender = message['from'].bare
+        if sender not in self._peers:
+            logger.warning('Ignoring shard message from unknown member: %s' % message['from'])
+            return
+
+        try:
+            self._coordinator.handle(json.loads(message['body']), sender)
+        except (ValueError, KeyError, TypeError):
+            logger.warning('Invalid shard message from: %s' % message['from'])
+
+
+class LocalShardTransport:
+    """
+    In process stand in for the xmpp transport, delivers the messages directly to every other coordinator that is
+    registered with the same hub.
+    """
+
+    def __init__(self, hub):
+        """
+        Construct the transport.
+        :param hub: list shared between all of the transports that should be able to reach each other.
+        """
+        self._hub = hub
+        self._coordinator = None
+
+    def register(self, coordinator):
+        self._coordinator = coordinator
+        self._hub.append(coordinator)
+
+    def close(self):
+        self._hub.remove(self._coordinator)
+
+    def send(self, message):
+        for coordinator in list(self._hub):
+            coordinator.handle(dict(message), self._coordinator.identity)
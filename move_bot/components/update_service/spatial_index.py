@@ -0,0 +1,75 @@
+"""
+Grid based index of place coordinates, used to match places that only provide a latitude/longitude to places that
+have already been stored.
+"""
+import math
+
+EARTH_RADIUS = 6371000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180.0
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """
+    Great circle distance between two points.
+    :return: distance in meters.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2.0) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """
+    Index of place identifiers bucketed into cells of a fixed size in degrees.  The cells are as tall as the search
+    radius, so only the cells surrounding the point have to be searched.
+    """
+
+    def __init__(self, radius=50.0):
+        """
+        Construct the index.
+        :param radius: distance in meters that a point has to be within to match a place.
+        """
+        self._radius = radius
+        self._cell_size = radius / METERS_PER_DEGREE
+        self._cells = {}
+
+    def __len__(self):
+        return sum(len(cell) for cell in self._cells.values())
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self._cell_size)), int(math.floor(lon / self._cell_size))
+
+    def insert(self, lat, lon, identifier):
+        """
+        Add a place to the index.
+        :param lat: latitude of the place.
+        :param lon: longitude of the place.
+        :param identifier: uri of the place.
+        :return:
+        """
+        self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, identifier))
+
+    def nearest(self, lat, lon):
+        """
+        Find the closest place within the radius of the point.
+        :param lat: latitude of the point.
+        :param lon: longitude of the point.
+        :return: uri of the closest place, or None if there isn't a place within the radius.
+        """
+        row, column = self._cell(lat, lon)
+
+        # Cells get narrower in meters as the latitude increases, so more columns have to be searched.
+        cosine = max(math.cos(math.radians(min(abs(lat) + self._cell_size, 90.0))), 1e-6)
+        column_span = min(int(math.ceil(1.0 / cosine)), int(math.ceil(360.0 / self._cell_size)))
+
+        best = None
+        best_distance = self._radius
+        for row_offset in (-1, 0, 1):
+            for column_offset in range(-column_span, column_span + 1):
+                for place_lat, place_lon, identifier in self._cells.get((row + row_offset, column + column_offset), ()):
+                    place_distance = distance(lat, lon, place_lat, place_lon)
+                    if place_distance <= best_distance:
+                        best = identifier
+                        best_distance = place_distance
+
+        return best
@@ -0,0 +1,186 @@
+"""
+Prioritized queue of the segments waiting to be processed by the update service.
+
+Segments are executed one at a time.  Whenever a segment finishes, the next segment is taken from the highest priority
+class that is not being held back by its throughput limit, so incremental updates pre-empt backfills at segment
+boundaries.
+"""
+import collections
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+INCREMENTAL = 0
+BACKFILL = 1
+
+CLASS_NAMES = {INCREMENTAL: 'incremental', BACKFILL: 'backfill'}
+
+
+class WorkBatch:
+    """
+    Collection of the work items that were submitted together, with the promise that is resolved once all of them have
+    been executed, or rejected when the first of them fails.
+    """
+
+    def __init__(self, promise, size):
+        self.promise = promise
+        self.remaining = size
+        self.failed = False
+
+
+class WorkItem:
+    """
+    Segment waiting to be executed.
+    """
+
+    def __init__(self, batch, execution, after=None):
+        """
+        Construct the item.
+        :param batch: batch that the item belongs to.
+        :param execution: callable that returns a promise that is resolved once the segment has been processed.
+        :param after: callable that is called once the execution has succeeded.
+        """
+        self.batch = batch
+        self.execution = execution
+        self.after = after
+
+
+class SegmentWorkQueue:
+    """
+    Queue of work items for each of the priority classes.
+    """
+
+    def __init__(self, scheduler, rates=None, clock=time.time):
+        """
+        Construct the queue.
+        :param scheduler: rho_bot_scheduler plugin.
+        :param rates: dictionary of the maximum number of segments per second that can be executed for each class,
+                      classes without a rate are not limited.
+        :param clock: callable that provides the current time.
+        """
+        self._scheduler = scheduler
+        self._rates = rates or {}
+        self._clock = clock
+        self._queues = dict((priority, collections.deque()) for priority in CLASS_NAMES)
+        self._next_allowed = dict((priority, 0.0) for priority in CLASS_NAMES)
+        self._processed = dict((priority, 0) for priority in CLASS_NAMES)
+        self._running = False
+        self._waiting = False
+
+    def metrics(self):
+        """
+        Depth of the queue and the number of segments processed for each class.
+        :return: dictionary of metrics.
+        """
+        metrics = {}
+        for priority, name in CLASS_NAMES.items():
+            metrics['%s_depth' % name] = len(self._queues[priority])
+            metrics['%s_processed' % name] = self._processed[priority]
+
+        return metrics
+
+    def submit(self, items, priority):
+        """
+        Queue the executions to be processed.
+        :param items: list of (execution, after) tuples.
+        :param priority: INCREMENTAL or BACKFILL
+        :return: promise that is resolved once all of the items have been executed.
+        """
+        batch = WorkBatch(self._scheduler.promise(), len(items))
+
+        if not items:
+            batch.promise.resolved(None)
+            return batch.promise
+
+        for execution, after in items:
+            self._queues[priority].append(WorkItem(batch, execution, after))
+
+        logger.info('Queued %s %s segments: %s' % (len(items), CLASS_NAMES[priority], self.metrics()))
+
+        self._pump()
+
+        return batch.promise
+
+    def _next_item(self):
+        """
+        Take the next item that can be executed off of the queues.
+        :return: (priority, item), or (None, delay) if the classes with items are being held back by their limits.
+        """
+        now = self._clock()
+        delay = None
+
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+
+            # Items of failed batches are dropped without being executed.
+            while queue and queue[0].batch.failed:
+                queue.popleft()
+
+            if not queue:
+                continue
+
+            if self._next_allowed[priority] > now:
+                wait = self._next_allowed[priority] - now
+                delay = wait if delay is None else min(delay, wait)
+                continue
+
+            rate = self._rates.get(priority, None)
+            if rate:
+                self._next_allowed[priority] = now + 1.0 / rate
+
+            return priority, queue.popleft()
+
+        return None, delay
+
+    def _wake(self):
+        self._waiting = False
+        self._pump()
+
+    def _pump(self):
+        """
+        Start executing the next item if nothing is executing.
+        :return:
+        """
+        if self._running:
+            return
+
+        priority, item = self._next_item()
+
+        if priority is None:
+            if item is not None and not self._waiting:
+                self._waiting = True
+                self._scheduler.schedule_task(self._wake, delay=item, repeat=False)
+            return
+
+        self._running = True
+
+        promise = self._scheduler.defer(item.execution)
+        promise.then(self._scheduler.generate_promise_handler(self._item_succeeded, priority, item),
+                     self._scheduler.generate_promise_handler(self._item_failed, priority, item))
+
+    def _item_succeeded(self, result, priority, item):
+        self._running = False
+        self._processed[priority] += 1
+
+        batch = item.batch
+        if not batch.failed:
+            if item.after:
+                item.after()
+
+            batch.remaining -= 1
+            if batch.remaining == 0:
+                batch.promise.resolved(result)
+                logger.debug('Finished %s batch: %s' % (CLASS_NAMES[priority], self.metrics()))
+
+        self._pump()
+
+    def _item_failed(self, error, priority, item):
+        self._running = False
+
+        batch = item.batch
+        if not batch.failed:
+            batch.failed = True
+            batch.promise.rejected(error)
+
+        self._pump()
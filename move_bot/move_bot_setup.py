@@ -1,19 +1,59 @@
 """
 Set up the bot for execution.
 """
+import logging
+import time
+
 from rhobot.application import Application
 from move_bot.components.commands import load_commands
 from move_bot.components import load_components
 
+logger = logging.getLogger(__name__)
+
+# Timing details about the start up of the bot, reported once the session has been started.
+_start_time = time.time()
+_startup_timings = []
+
+
+def _timed(name, method):
+    """
+    Wrap a set up method so that the time spent in it is recorded in the start up timing report.
+    :param name: name to report the timing under.
+    :param method: method to wrap.
+    :return: wrapped method.
+    """
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _startup_timings.append((name, time.time() - start))
+
+    return wrapper
+
+
+def _report_startup(*args, **kwargs):
+    """
+    Log the time spent in each of the set up steps, and the total time until the session was started.
+    :return:
+    """
+    for name, elapsed in _startup_timings:
+        logger.info('Startup: %s took %.3fs' % (name, elapsed))
+
+    logger.info('Startup: session started after %.3fs' % (time.time() - _start_time))
+
 
 application = Application()
 
 # Register all of the components that are defined in this application.
-application.pre_init(load_commands)
-application.pre_init(load_components)
+application.pre_init(_timed('load_commands', load_commands))
+application.pre_init(_timed('load_components', load_components))
+
 
 @application.post_init
 def register_plugins(bot):
+    start = time.time()
+
     # Components
     bot.register_plugin('update_service')
 
@@ -21,3 +61,12 @@ def register_plugins(bot):
     bot.register_plugin('configure_client_details')
     bot.register_plugin('configure_access_token')
     bot.register_plugin('fetch_from_month')
+    bot.register_plugin('export_range')
+    bot.register_plugin('import_archive')
+    bot.register_plugin('profile_updates')
+    bot.register_plugin('query_events')
+    bot.register_plugin('ledger_coverage')
+
+    _startup_timings.append(('register_plugins', time.time() - start))
+
+    bot.add_event_handler('session_start', _report_startup, disposable=True)
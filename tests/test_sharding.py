@@ -0,0 +1,213 @@
+"""
+Tests for the coordination of the update cycles between several move_bot instances.
+"""
+import json
+import unittest
+
+from move_bot.components.update_service.sharding import ShardCoordinator, LocalShardTransport, XmppShardTransport, \
+    SHARD_SUBJECT, COMMITTED
+
+DAYS = ['201509%02d' % day for day in range(1, 31)]
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingTransport(LocalShardTransport):
+    """
+    Local transport that keeps a copy of every message that was sent through it.
+    """
+
+    def __init__(self, hub):
+        LocalShardTransport.__init__(self, hub)
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+        LocalShardTransport.send(self, message)
+
+
+class ShardGroupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.hub = []
+        self.plans = {}
+        self.commits = {}
+        self.coordinators = dict((identity, self._coordinator(identity))
+                                 for identity in ['a@example.com', 'b@example.com', 'c@example.com'])
+
+        for coordinator in self.coordinators.values():
+            coordinator.heartbeat()
+
+        self.committer = self.coordinators['a@example.com']
+
+    def _coordinator(self, identity):
+        coordinator = ShardCoordinator(identity, RecordingTransport(self.hub), lease_duration=60.0, clock=self.clock)
+        self.plans[identity] = []
+        self.commits[identity] = []
+        coordinator.on_plan = self.plans[identity].append
+        coordinator.on_commit = self.commits[identity].append
+        return coordinator
+
+    def _report(self, identity, plan, last_update):
+        coordinator = self.coordinators[identity]
+        if identity != plan.committer:
+            plan = self.plans[identity][-1]
+
+        coordinator.report(plan, last_update)
+
+    def test_committer_is_first_member(self):
+        self.assertTrue(self.committer.is_committer())
+        self.assertFalse(self.coordinators['b@example.com'].is_committer())
+        self.assertFalse(self.coordinators['c@example.com'].is_committer())
+
+    def test_each_day_has_one_owner(self):
+        # A member that has a different view of the group still partitions with the members of the plan.
+        self.clock.now += 45.0
+        self.coordinators['a@example.com'].heartbeat()
+        self.coordinators['c@example.com'].heartbeat()
+        self.clock.now += 30.0
+        self.assertEqual(['a@example.com', 'c@example.com'], self.committer.members())
+        self.assertEqual(['a@example.com', 'c@example.com'], self.coordinators['c@example.com'].members())
+
+        plan = self.committer.publish_plan(DAYS)
+
+        self.assertEqual([], self.plans['b@example.com'])
+        self.assertEqual(1, len(self.plans['c@example.com']))
+
+        received = self.plans['c@example.com'][0]
+        owned = plan.owned_days('a@example.com') + received.owned_days('c@example.com')
+        self.assertEqual(sorted(DAYS), sorted(owned))
+
+        for day in DAYS:
+            self.assertEqual(1, sum(1 for member in plan.members if day in received.owned_days(member)))
+
+    def test_all_members_receive_the_same_plan(self):
+        plan = self.committer.publish_plan(DAYS, since='20150901T000000Z')
+
+        for identity in ['b@example.com', 'c@example.com']:
+            received = self.plans[identity][0]
+            self.assertEqual(plan.cycle, received.cycle)
+            self.assertEqual(plan.members, received.members)
+            self.assertEqual(plan.days, received.days)
+            self.assertEqual(plan.since, received.since)
+
+        self.assertEqual([], self.plans['a@example.com'])
+
+    def test_only_committer_commits(self):
+        plan = self.committer.publish_plan(DAYS, since='20150901T000000Z')
+
+        self._report('b@example.com', plan, '20150910T000000Z')
+        self._report('c@example.com', plan, '20150905T000000Z')
+        self._report('a@example.com', plan, '20150903T000000Z')
+
+        for identity, coordinator in self.coordinators.items():
+            committed = [message for message in coordinator._transport.sent if message['type'] == COMMITTED]
+            self.assertEqual(1 if identity == 'a@example.com' else 0, len(committed))
+
+            self.assertEqual(['20150910T000000Z'], self.commits[identity])
+
+        self.assertIsNone(self.coordinators['b@example.com'].watermark())
+        self.assertIsNone(self.coordinators['c@example.com'].watermark())
+
+    def test_watermark_waits_for_lagging_member(self):
+        plan = self.committer.publish_plan(DAYS, since='20150901T000000Z')
+
+        self._report('a@example.com', plan, '20150903T000000Z')
+        self._report('b@example.com', plan, '20150910T000000Z')
+
+        self.assertIsNone(self.committer.watermark())
+        self.assertEqual([], self.commits['a@example.com'])
+
+        self._report('c@example.com', plan, '20150905T000000Z')
+
+        self.assertEqual('20150910T000000Z', self.committer.watermark())
+        self.assertEqual(['20150910T000000Z'], self.commits['a@example.com'])
+
+    def test_reports_of_abandoned_plan_are_ignored(self):
+        old_plan = self.committer.publish_plan(DAYS)
+        self._report('b@example.com', old_plan, '20150910T000000Z')
+
+        plan = self.committer.publish_plan(DAYS)
+        self._report('a@example.com', plan, '20150903T000000Z')
+        self._report('c@example.com', plan, '20150905T000000Z')
+
+        self.assertIsNone(self.committer.watermark())
+        self.assertEqual([], self.commits['a@example.com'])
+
+    def test_plan_from_other_member_is_ignored(self):
+        plan = self.committer.publish_plan(DAYS)
+
+        self.coordinators['c@example.com'].handle(plan.to_message(), 'b@example.com')
+
+        self.assertEqual(1, len(self.plans['c@example.com']))
+
+
+class FakeJid:
+
+    def __init__(self, bare):
+        self.bare = bare
+
+    def __str__(self):
+        return self.bare
+
+
+class FakeXmpp:
+
+    def __init__(self):
+        self.handlers = {}
+        self.sent = []
+
+    def add_event_handler(self, name, handler):
+        self.handlers[name] = handler
+
+    def del_event_handler(self, name, handler):
+        self.handlers.pop(name, None)
+
+    def send_message(self, **kwargs):
+        self.sent.append(kwargs)
+
+
+class XmppShardTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.xmpp = FakeXmpp()
+        self.coordinator = ShardCoordinator('a@example.com',
+                                            XmppShardTransport(self.xmpp, ['a@example.com', 'b@example.com']),
+                                            clock=self.clock)
+
+    def _deliver(self, sender, message):
+        self.xmpp.handlers['message'](dict(subject=SHARD_SUBJECT, body=json.dumps(message), **{'from': sender}))
+
+    def test_sends_to_other_peers(self):
+        self.coordinator.heartbeat()
+
+        self.assertEqual(['b@example.com'], [message['mto'] for message in self.xmpp.sent])
+
+    def test_messages_are_not_stored_offline(self):
+        self.coordinator.heartbeat()
+        self.coordinator.publish_plan(['20150901'])
+
+        self.assertEqual(['headline', 'headline'], [message['mtype'] for message in self.xmpp.sent])
+
+    def test_member_is_taken_from_sender(self):
+        self._deliver(FakeJid('b@example.com'), dict(type='heartbeat', duration=60.0, member='c@example.com'))
+
+        self.assertEqual(['a@example.com', 'b@example.com'], self.coordinator.members())
+
+    def test_unknown_sender_is_dropped(self):
+        self._deliver(FakeJid('mallory@example.com'), dict(type='heartbeat', duration=60.0))
+
+        self.assertEqual(['a@example.com'], self.coordinator.members())
+
+
+if __name__ == '__main__':
+    unittest.main()